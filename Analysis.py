@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Batch analysis: the best move and score of player 2 for a stream of positions.
+
+Positions are read lazily from files in any of these formats:
+- CSV boards as in testcases/: 6 lines of 7 comma-separated cells, top row
+  first. A file may hold any number of boards one after another; blank lines
+  between them are skipped.
+- Packed boards (any other extension): one board per line, 42 digits 0, 1
+  or 2, row by row from the top.
+- Binary position files (see Records.py), recognised by their header.
+
+Positions are searched in chunks by worker processes. Every worker keeps one
+GameTreePlayer for all the positions it is given, so its transposition table,
+history scores and the pages of the opening book and tablebase files carry
+over from one position to the next. Only a few chunks per worker are in
+flight at a time, so memory stays bounded however long the input is, and
+results are yielded (as JSON lines by the command line) as soon as a chunk
+is done, not in input order; index gives the input order.
+
+Usage: python3 Analysis.py testcases/*.csv --depth 5 --output analysis.jsonl
+"""
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import itertools
+import json
+import os
+import sys
+
+from Evaluation import EVALUATORS
+from main import GameTreePlayer
+import Records
+
+
+def ReadCSVBoards(path):
+    # Yield (line number of the first row, state) for every board of a CSV file
+    rows = []
+    with open(path, 'r') as f:
+        for lineNumber, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            row = [int(cell) for cell in line.split(',')]
+            if len(row) != 7:
+                raise ValueError("{0}:{1}: expected 7 cells".format(path, lineNumber))
+            rows.append(row)
+            if len(rows) == 6:
+                yield lineNumber - 5, rows
+                rows = []
+    if rows:
+        raise ValueError("{0}: incomplete board at the end of the file".format(path))
+
+
+def ReadPackedBoards(path):
+    # Yield (line number, state) for every board of a packed file
+    with open(path, 'r') as f:
+        for lineNumber, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            if len(line) != 42:
+                raise ValueError("{0}:{1}: expected 42 cells".format(path, lineNumber))
+            yield lineNumber, UnpackBoard(line)
+
+
+def PackBoard(state):
+    # A GetCurrentState() grid as one line of a packed file
+    return ''.join(str(cell) for row in state for cell in row)
+
+
+def UnpackBoard(line):
+    cells = [int(cell) for cell in line]
+    return [cells[row * 7:row * 7 + 7] for row in range(6)]
+
+
+def ReadPositions(paths):
+    """
+    Yield (source, state) for every board of the given files, one at a time.
+    source is "path:line" of the board, or "path:index" in a binary file.
+    """
+    for path in paths:
+        if Records.IsRecordFile(path):
+            for index, state in enumerate(Records.ReadPositions(path)):
+                yield "{0}:{1}".format(path, index), state
+            continue
+        reader = ReadCSVBoards if path.endswith('.csv') else ReadPackedBoards
+        for lineNumber, state in reader(path):
+            yield "{0}:{1}".format(path, lineNumber), state
+
+
+# The player of a worker process, created by _InitWorker
+_analysisPlayer = None
+
+
+def _InitWorker(settings):
+    global _analysisPlayer
+    _analysisPlayer = GameTreePlayer(**settings)
+
+
+def _AnalyseChunk(chunk, timeBudget):
+    results = []
+    for index, source, state in chunk:
+        stats = _analysisPlayer.Search(state, timeBudget)
+        results.append({
+            'index': index,
+            'source': source,
+            'bestAction': stats.bestAction,
+            'score': stats.score,
+            'depth': stats.depth,
+            'nodes': stats.nodes,
+            'time': stats.time,
+            'bookHit': stats.bookHit,
+            'cacheHit': stats.cacheHit,
+            'solved': stats.solved,
+            'distanceToMate': stats.distanceToMate,
+        })
+    return results
+
+
+def AnalysePositions(positions, workers=None, chunkSize=8, timeBudget=None, **settings):
+    """
+    Search every position of an iterable of (source, state) pairs in worker
+    processes and yield one result dict per position as soon as it is ready.
+
+    Parameters:
+    positions (iterable): (source, GetCurrentState() grid) pairs, player 2 to move.
+    workers (int): Worker processes (default: one per CPU).
+    chunkSize (int): Positions sent to a worker at a time.
+    timeBudget (float): Seconds per position, see GameTreePlayer.Search.
+    settings: GameTreePlayer arguments for the players of the workers
+        (cutOffDepth, transpositionTableSize, openingBook, tablebase, ...).
+
+    Returns:
+    results (generator of dict): index (position in the input), source,
+    bestAction, score, depth, nodes, time, bookHit, cacheHit, solved and
+    distanceToMate.
+    """
+    workers = workers or os.cpu_count() or 1
+    numbered = ((index, source, state) for index, (source, state) in enumerate(positions))
+    with ProcessPoolExecutor(workers, initializer=_InitWorker, initargs=(settings,)) as executor:
+        pending = set()
+        while True:
+            chunk = list(itertools.islice(numbered, chunkSize))
+            if not chunk:
+                break
+            pending.add(executor.submit(_AnalyseChunk, chunk, timeBudget))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield from future.result()
+        for future in wait(pending).done:
+            yield from future.result()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('inputs', nargs='+',
+                        help='CSV, packed or binary board files (player 2 to move)')
+    parser.add_argument('--depth', type=int, default=5)
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='seconds per position, searching by iterative deepening')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--chunk-size', type=int, default=8,
+                        help='positions sent to a worker at a time')
+    parser.add_argument('--transposition-table-size', type=int, default=1 << 18,
+                        help='entries per worker, 0 disables the tables')
+    parser.add_argument('--book', default=None,
+                        help='opening book file (see OpeningBook.py)')
+    parser.add_argument('--tablebase', default=None,
+                        help='tablebase file (see Tablebase.py)')
+    parser.add_argument('--position-cache', default=None,
+                        help='position cache file shared by the workers (see PositionCache.py)')
+    parser.add_argument('--evaluation', default='heuristic3', choices=sorted(EVALUATORS),
+                        help='heuristic scoring the positions at the cutoff depth')
+    parser.add_argument('--output', default=None,
+                        help='JSON lines file for the results (default: stdout)')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        for result in AnalysePositions(ReadPositions(args.inputs), args.workers, args.chunk_size,
+                                       args.time_budget, cutOffDepth=args.depth,
+                                       transpositionTableSize=args.transposition_table_size,
+                                       openingBook=args.book, tablebase=args.tablebase,
+                                       evaluation=args.evaluation,
+                                       positionCache=args.position_cache):
+            out.write(json.dumps(result) + '\n')
+            out.flush()
+    finally:
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,134 @@
+"""
+NumPy evaluation of many boards in one call.
+
+Boards are stacked into an (N, 6, 7) array and every four-cell window is read
+at once through precomputed window-index arrays. The scores are the same as
+GameTreePlayer.EvaluateBoard with heuristicFunction3 (including the +-100000
+scores of won boards).
+
+BatchGameTreePlayer uses this inside the search. Below a frontier depth it
+expands every line in full and scores all the leaves in one batch.
+"""
+import numpy as np
+
+from Bitboard import WINDOW_CELLS, CellBit
+from main import GameTreePlayer
+
+# Flat (row * 7 + col) cell indices of the windows heuristicFunction3 counts
+WINDOW_INDEX = np.array([[row * 7 + col for row, col in cells]
+                         for cells in WINDOW_CELLS], dtype=np.intp)
+
+# The windows that are real lines on the board (not wrapped past the top
+# row), used to find won boards the way GameTreePlayer.winner does
+LINE_INDEX = np.array([[row * 7 + col for row, col in cells]
+                       for cells in WINDOW_CELLS
+                       if all(abs(cells[i][0] - cells[i + 1][0]) <= 1 for i in range(3))],
+                      dtype=np.intp)
+
+# Score of a window by the number of coins of a single player in it
+WINDOW_WEIGHTS = np.array([0, 10, 100, 1000, 0], dtype=np.int64)
+
+# Bit index of each grid cell in a Bitboard
+CELL_SHIFTS = np.array([CellBit(row, col).bit_length() - 1
+                        for row in range(6) for col in range(7)], dtype=np.uint64)
+
+
+def HeuristicBatch(boards):
+    """
+    heuristicFunction3 for a stack of boards.
+
+    Parameters:
+    boards (array of shape (N, 6, 7)): 0 for empty, 1 and 2 for the players' coins.
+
+    Returns:
+    scores (int64 array of shape (N,)).
+    """
+    flat = np.asarray(boards).reshape(-1, 42)
+    windows = flat[:, WINDOW_INDEX]
+    count1 = (windows == 1).sum(axis=2)
+    count2 = (windows == 2).sum(axis=2)
+    opp1 = np.where(count2 == 0, WINDOW_WEIGHTS[count1], 0).sum(axis=1)
+    opp2 = np.where(count1 == 0, WINDOW_WEIGHTS[count2], 0).sum(axis=1)
+    return opp2 - opp1
+
+
+def EvaluateBatch(boards):
+    """
+    GameTreePlayer.EvaluateBoard for a stack of boards: 100000 if player 2 has
+    four in a row, -100000 if player 1 has, heuristicFunction3 otherwise.
+    """
+    flat = np.asarray(boards).reshape(-1, 42)
+    lines = flat[:, LINE_INDEX]
+    won1 = (lines == 1).all(axis=2).any(axis=1)
+    won2 = (lines == 2).all(axis=2).any(axis=1)
+    scores = HeuristicBatch(flat)
+    scores = np.where(won2, 100000, scores)
+    return np.where(won1, -100000, scores)
+
+
+def BitboardsToArray(bitboards):
+    """
+    Unpack (player 1, player 2) bitboard pairs into an (N, 6, 7) int8 array.
+    """
+    pairs = np.array(bitboards, dtype=np.uint64).reshape(-1, 2)
+    bits1 = (pairs[:, 0:1] >> CELL_SHIFTS) & np.uint64(1)
+    bits2 = (pairs[:, 1:2] >> CELL_SHIFTS) & np.uint64(1)
+    return (bits1 + 2 * bits2).astype(np.int8).reshape(-1, 6, 7)
+
+
+def EvaluateStates(states):
+    # Score a list of GetCurrentState() grids, e.g. saved positions
+    return EvaluateBatch(np.array(states, dtype=np.int8).reshape(-1, 6, 7))
+
+
+class BatchGameTreePlayer(GameTreePlayer):
+    """
+    GameTreePlayer that scores the last batchDepth plies of the search in bulk.
+
+    When batchDepth plies are left, the node is expanded to full width down to
+    the horizon. All the leaves are scored with one EvaluateBatch call and the
+    minimax values are backed up. The values are the exact minimax values, so
+    the chosen moves are the same as those of GameTreePlayer(threatPruning=False).
+    Full width costs more nodes than alpha-beta over the last plies, but the
+    leaves are scored far faster.
+    """
+
+    def __init__(self, cutOffDepth=3, transpositionTableSize=1 << 18, timeBudget=None, batchDepth=2):
+        # The leaves are scored in bulk, so window counts need not be kept per
+        # move. The frontier is searched in full, without threat pruning.
+        GameTreePlayer.__init__(self, cutOffDepth, transpositionTableSize, timeBudget,
+                                incrementalEvaluation=False, threatPruning=False)
+        self.batchDepth = batchDepth
+
+    def MinimaxAlphaBeta(self, currentState, depth, alpha, beta, isMaximizingPlayer):
+        if 0 < depth <= self.batchDepth:
+            return self.EvaluateFrontier(currentState, depth, isMaximizingPlayer)
+        return GameTreePlayer.MinimaxAlphaBeta(self, currentState, depth, alpha, beta, isMaximizingPlayer)
+
+    def EvaluateFrontier(self, currentState, depth, isMaximizingPlayer):
+        leaves = []
+        tree = self._Expand(currentState, depth, isMaximizingPlayer, leaves)
+        scores = EvaluateBatch(BitboardsToArray(leaves)).tolist()
+        return self._BackUp(tree, scores)
+
+    def _Expand(self, currentState, depth, isMaximizingPlayer, leaves):
+        # Returns a leaf index, or (isMaximizingPlayer, children) for an inner node
+        self.stats.nodes += 1
+        if depth == 0 or self.IsGameFinished(currentState):
+            leaves.append(tuple(currentState.bitboards))
+            return len(leaves) - 1
+        children = []
+        player = 2 if isMaximizingPlayer else 1
+        for action in self.ValidActions(currentState):
+            self.MakeMove(currentState, action, player)
+            children.append(self._Expand(
+                currentState, depth - 1, not isMaximizingPlayer, leaves))
+            self.UnmakeMove(currentState)
+        return isMaximizingPlayer, children
+
+    def _BackUp(self, tree, scores):
+        if isinstance(tree, int):
+            return scores[tree]
+        isMaximizingPlayer, children = tree
+        values = [self._BackUp(child, scores) for child in children]
+        return max(values) if isMaximizingPlayer else min(values)
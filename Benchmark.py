@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""
+Search benchmark over a fixed corpus of positions, with regression checks.
+
+The corpus is the testcases/ files plus generated opening, middlegame and
+endgame sets (random non-losing play from a fixed seed, player 2 to move).
+Every position is searched by a fresh GameTreePlayer at every depth, so node
+counts do not depend on what ran before and are the same in every run.
+The solver is switched off so that endgames are searched too.
+
+For every set and depth the benchmark records the positions, nodes, wall
+time, nodes per second, transposition table hit rate and the effective
+branching factor (the depth-th root of the mean nodes per position).
+
+With --baseline it compares the run to an earlier output file and exits
+with status 1 if a metric got worse by more than --threshold (a fraction).
+Node counts are deterministic; times depend on the machine and its load.
+
+Usage: python3 Benchmark.py --depths 4 6 8 --output bench.json --baseline baseline.json
+"""
+import argparse
+import glob
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+from main import GameTreePlayer, LoadTestcaseStateFromCSVfile
+from Solver import RandomPosition
+
+# Generated sets: (name, coins on the board)
+STAGES = (('opening', 5), ('middlegame', 15), ('endgame', 27))
+
+# Metrics compared against a baseline, and whether higher is better
+METRICS = {'nodes': False, 'time': False, 'nodesPerSecond': True}
+# Metrics that depend on the clock
+TIMED_METRICS = ('time', 'nodesPerSecond')
+# The test cases next to this file, wherever the benchmark is run from
+TESTCASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testcases', '*.csv')
+
+
+def BuildCorpus(count=10, seed=0, testcases=TESTCASES):
+    """
+    Returns:
+    corpus (list of (name, [GetCurrentState() grids])): The test cases, then
+    count positions for every stage of STAGES.
+    """
+    corpus = [('testcases', [LoadTestcaseStateFromCSVfile(path)
+                             for path in sorted(glob.glob(testcases))])]
+    rng = random.Random(seed)
+    for name, moveCount in STAGES:
+        states = []
+        while len(states) < count:
+            position = RandomPosition(rng, moveCount)
+            if position is not None:
+                states.append(position[0].ToState())
+        corpus.append((name, states))
+    return corpus
+
+
+def RunBenchmark(corpus, depths=(4, 6, 8), transpositionTableSize=1 << 18):
+    """
+    Search every position of the corpus at every depth.
+
+    Returns:
+    results (list of dict): One per set and depth. Empty sets are left out.
+    """
+    results = []
+    for name, states in corpus:
+        if not states:
+            continue
+        for depth in depths:
+            nodes = 0
+            seconds = 0.0
+            hits = 0
+            probes = 0
+            for state in states:
+                player = GameTreePlayer(depth, transpositionTableSize, solverThreshold=0)
+                stats = player.Search(state)
+                nodes += stats.nodes
+                seconds += stats.time
+                hits += stats.ttHits
+                probes += stats.ttHits + stats.ttMisses
+            meanNodes = nodes / len(states)
+            results.append({
+                'set': name,
+                'depth': depth,
+                'positions': len(states),
+                'nodes': nodes,
+                'time': seconds,
+                'nodesPerSecond': nodes / seconds if seconds > 0 else 0.0,
+                'ttHitRate': hits / probes if probes else 0.0,
+                'effectiveBranchingFactor': meanNodes ** (1.0 / depth),
+            })
+    return results
+
+
+def CompareWithBaseline(results, baseline, threshold=0.1, minTime=0.5):
+    """
+    Returns:
+    regressions (list of dict): set, depth, metric, the baseline and current
+    values and the relative change, for every metric of METRICS that got
+    worse by more than threshold. Sets and depths missing from either run
+    are skipped, and so are the timed metrics of a set and depth that took
+    less than minTime seconds in the baseline, as these are mostly noise.
+    """
+    previous = {(r['set'], r['depth']): r for r in baseline}
+    regressions = []
+    for result in results:
+        before = previous.get((result['set'], result['depth']))
+        if before is None:
+            continue
+        for metric, higherIsBetter in METRICS.items():
+            if metric in TIMED_METRICS and before['time'] < minTime:
+                continue
+            old = before[metric]
+            new = result[metric]
+            if old == 0:
+                continue
+            change = (new - old) / old
+            if (-change if higherIsBetter else change) > threshold:
+                regressions.append({
+                    'set': result['set'], 'depth': result['depth'], 'metric': metric,
+                    'baseline': old, 'current': new, 'change': change,
+                })
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=[4, 6, 8])
+    parser.add_argument('--positions', type=int, default=10,
+                        help='positions per generated set')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--transposition-table-size', type=int, default=1 << 18,
+                        help='0 disables the transposition table')
+    parser.add_argument('--output', default=None,
+                        help='JSON file for the results (default: stdout)')
+    parser.add_argument('--baseline', default=None,
+                        help='earlier output to compare with')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='largest allowed relative slowdown or node increase')
+    parser.add_argument('--min-time', type=float, default=0.5,
+                        help='seconds a set and depth must take in the baseline to compare its times')
+    args = parser.parse_args()
+
+    startTime = time.time()
+    results = RunBenchmark(BuildCorpus(args.positions, args.seed), args.depths,
+                           args.transposition_table_size)
+    report = {
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'seed': args.seed,
+        'positions': args.positions,
+        'transpositionTableSize': args.transposition_table_size,
+        'duration': time.time() - startTime,
+        'results': results,
+    }
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = CompareWithBaseline(results, json.load(f)['results'], args.threshold,
+                                              args.min_time)
+        report['regressions'] = regressions
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(text + '\n')
+    else:
+        print(text)
+    for regression in regressions:
+        print("Regression: {set} depth {depth} {metric} {baseline:.4g} -> {current:.4g} "
+              "({change:+.1%})".format(**regression), file=sys.stderr)
+    if regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,396 @@
+import random
+
+WIDTH = 7
+HEIGHT = 6
+# Each column uses HEIGHT+1 bits, the extra (sentinel) bit on top keeps the
+# shift-and-mask win check from wrapping from one column into the next.
+COLUMN_BITS = HEIGHT + 1
+
+BOTTOM_MASK = 0
+for _col in range(WIDTH):
+    BOTTOM_MASK |= 1 << (_col * COLUMN_BITS)
+BOARD_MASK = BOTTOM_MASK * ((1 << HEIGHT) - 1)
+
+# Shifts for the four directions: vertical, horizontal, and both diagonals.
+DIRECTIONS = (1, COLUMN_BITS, COLUMN_BITS - 1, COLUMN_BITS + 1)
+
+
+def CellBit(row, col):
+    # Returns the bit of the cell at (row, col) of a GetCurrentState() grid.
+    # Grid row 0 is the top of the board, bit 0 of a column is its bottom.
+    return 1 << (col * COLUMN_BITS + (HEIGHT - 1 - row))
+
+
+def ColumnMask(col):
+    return ((1 << HEIGHT) - 1) << (col * COLUMN_BITS)
+
+
+# All COLUMN_BITS bits of each column, and the bit index each bit index
+# mirrors to
+_COLUMNS = tuple(((1 << COLUMN_BITS) - 1) << (col * COLUMN_BITS) for col in range(WIDTH))
+MIRROR_POSITIONS = tuple((WIDTH - 1 - pos // COLUMN_BITS) * COLUMN_BITS + pos % COLUMN_BITS
+                         for pos in range(WIDTH * COLUMN_BITS))
+
+
+def MirrorBits(bits):
+    # Swap columns 0-6, 1-5 and 2-4 of a bitboard (or of Bitboard.Key)
+    return ((bits & _COLUMNS[0]) << 42) | ((bits & _COLUMNS[1]) << 28) \
+        | ((bits & _COLUMNS[2]) << 14) | (bits & _COLUMNS[3]) \
+        | ((bits & _COLUMNS[4]) >> 14) | ((bits & _COLUMNS[5]) >> 28) \
+        | ((bits & _COLUMNS[6]) >> 42)
+
+
+def MirrorMove(col):
+    return WIDTH - 1 - col
+
+
+def _BuildWindowCells():
+    # The four-cell windows in the order findNumberOfOpportunities2 scans
+    # them: rows, columns, down-right diagonals, up-right diagonals.
+    # The up-right scan starts at row 2, so four of its windows reach row -1,
+    # which Python list indexing wraps to row 5. Those windows are kept (as
+    # the wrapped cells) so the bitboard counts match the grid heuristic.
+    windows = []
+    for row in range(6):
+        for col in range(4):
+            windows.append(tuple((row, col + i) for i in range(4)))
+    for col in range(7):
+        for row in range(3):
+            windows.append(tuple((row + i, col) for i in range(4)))
+    for row in range(3):
+        for col in range(4):
+            windows.append(tuple((row + i, col + i) for i in range(4)))
+    for row in range(2, 6):
+        for col in range(4):
+            windows.append(tuple(((row - i) % 6, col + i) for i in range(4)))
+    return tuple(windows)
+
+
+def _CellsMask(cells):
+    mask = 0
+    for row, col in cells:
+        mask |= CellBit(row, col)
+    return mask
+
+
+# (row, col) cells of each window, and the same windows as bit masks
+WINDOW_CELLS = _BuildWindowCells()
+WINDOW_MASKS = tuple(_CellsMask(cells) for cells in WINDOW_CELLS)
+
+
+def _BuildZobristKeys():
+    # One random 64-bit key per (player, bit index); fixed seed so the hash of
+    # a position is the same in every process and every run.
+    rng = random.Random(20231017)
+    keys = [[rng.getrandbits(64) for _ in range(WIDTH * COLUMN_BITS)]
+            for _ in range(2)]
+    return keys, rng.getrandbits(64)
+
+
+# ZOBRIST_SIDE is xor-ed in by the search when player 2 is to move.
+ZOBRIST_KEYS, ZOBRIST_SIDE = _BuildZobristKeys()
+
+
+def IsWin(bitboard):
+    # Shift-and-mask test for four coins in a row in any direction.
+    for shift in DIRECTIONS:
+        m = bitboard & (bitboard >> shift)
+        if m & (m >> (2 * shift)):
+            return True
+    return False
+
+
+def WinningCells(bitboard, mask):
+    # Empty cells (playable now or not) where a coin of the bitboard's owner
+    # would complete four in a row; mask holds the cells already taken.
+    # vertical: only the cell right above three coins
+    cells = (bitboard << 1) & (bitboard << 2) & (bitboard << 3)
+    for shift in DIRECTIONS[1:]:
+        # three coins on one side of the cell, or two on one side and one on the other
+        pair = (bitboard << shift) & (bitboard << (2 * shift))
+        cells |= pair & (bitboard << (3 * shift))
+        cells |= pair & (bitboard >> shift)
+        pair = (bitboard >> shift) & (bitboard >> (2 * shift))
+        cells |= pair & (bitboard << shift)
+        cells |= pair & (bitboard >> (3 * shift))
+    return cells & (BOARD_MASK ^ mask)
+
+
+def IsLineThrough(bitboard, pos):
+    # Checks only the four lines through bit pos, the same way
+    # FourConnect._47_CanAPlayerWin walks out from the last coin.
+    # At most three steps each way per direction, so the cost is constant.
+    for shift in DIRECTIONS:
+        count = 1
+        p = pos + shift
+        while count < 4 and (bitboard >> p) & 1:
+            count += 1
+            p += shift
+        p = pos - shift
+        while count < 4 and p >= 0 and (bitboard >> p) & 1:
+            count += 1
+            p -= shift
+        if count >= 4:
+            return True
+    return False
+
+
+class Bitboard:
+    """
+    Compact FourConnect position.
+
+    bitboards[0] holds the coins of player 1 (Myopic) and bitboards[1] the
+    coins of player 2 (Game Tree). Bit col*7+h is the cell at height h
+    (0 = bottom) of column col. heights[col] is the bit index of the next
+    free cell of that column.
+
+    Moves are applied and undone in place with Push and Pop, so a search can
+    run on a single Bitboard without ever copying it. The columns played since
+    the position was set up are kept in moves, which lets Winner look only at
+    the lines through the last coin. hash is the Zobrist hash of the coins on
+    the board and mirrorHash that of the board mirrored left to right; Push
+    and Pop update both.
+
+    A position and its mirror image have the same game value, with moves
+    mirrored by MirrorMove. CanonicalKey and CanonicalHash give both the same
+    key, so tables can store one entry for the pair.
+    """
+
+    def __init__(self):
+        self.bitboards = [0, 0]
+        self.heights = [col * COLUMN_BITS for col in range(WIDTH)]
+        self.moveCount = 0
+        self.moves = []
+        self.hash = 0
+        self.mirrorHash = 0
+
+    @classmethod
+    def FromState(cls, currentState):
+        # Build a Bitboard from a FourConnect.GetCurrentState() grid.
+        board = cls()
+        for col in range(WIDTH):
+            for row in range(HEIGHT - 1, -1, -1):
+                player = currentState[row][col]
+                if player == 0:
+                    break
+                board.Push(col, player)
+        # The grid does not tell the order the coins were played in
+        board.moves = []
+        return board
+
+    @classmethod
+    def FromKey(cls, key):
+        # Build a Bitboard from a Key(): in every column the coins are the
+        # bits below the highest set bit, player 1's coins are set
+        board = cls()
+        for col in range(WIDTH):
+            bits = (key >> (col * COLUMN_BITS)) & ((1 << COLUMN_BITS) - 1)
+            for h in range(bits.bit_length() - 1):
+                board.Push(col, 1 if (bits >> h) & 1 else 2)
+        board.moves = []
+        return board
+
+    def ToState(self):
+        # Convert back to a 6x7 list of lists as used by FourConnect.
+        state = [[0] * WIDTH for _ in range(HEIGHT)]
+        for row in range(HEIGHT):
+            for col in range(WIDTH):
+                bit = CellBit(row, col)
+                if self.bitboards[0] & bit:
+                    state[row][col] = 1
+                elif self.bitboards[1] & bit:
+                    state[row][col] = 2
+        return state
+
+    def Copy(self):
+        board = self.__class__()
+        board.bitboards = self.bitboards[:]
+        board.heights = self.heights[:]
+        board.moveCount = self.moveCount
+        board.moves = self.moves[:]
+        board.hash = self.hash
+        board.mirrorHash = self.mirrorHash
+        return board
+
+    def Mask(self):
+        return self.bitboards[0] | self.bitboards[1]
+
+    def Key(self):
+        # Unique 49-bit key of the position: one marker bit above the top coin
+        # of every column, plus player 1's coins
+        return (self.Mask() + BOTTOM_MASK) | self.bitboards[0]
+
+    def CanonicalKey(self):
+        """
+        Returns:
+        key (int), mirrored (bool): The smaller of Key() and the key of the
+        mirrored position, and whether it is the mirrored one (so moves
+        stored under the key must be mapped with MirrorMove).
+        """
+        key = self.Key()
+        mirrorKey = MirrorBits(key)
+        if mirrorKey < key:
+            return mirrorKey, True
+        return key, False
+
+    def CanonicalHash(self):
+        # The same for the Zobrist hash
+        if self.mirrorHash < self.hash:
+            return self.mirrorHash, True
+        return self.hash, False
+
+    def CanPlay(self, col):
+        return self.heights[col] < col * COLUMN_BITS + HEIGHT
+
+    def Push(self, col, player):
+        # Drop a coin of the given player into the column.
+        pos = self.heights[col]
+        self.bitboards[player - 1] |= 1 << pos
+        self.hash ^= ZOBRIST_KEYS[player - 1][pos]
+        self.mirrorHash ^= ZOBRIST_KEYS[player - 1][MIRROR_POSITIONS[pos]]
+        self.heights[col] += 1
+        self.moveCount += 1
+        self.moves.append(col)
+
+    def Pop(self):
+        # Take back the last move.
+        col = self.moves.pop()
+        self.heights[col] -= 1
+        pos = self.heights[col]
+        bit = 1 << pos
+        player = 1 if self.bitboards[0] & bit else 2
+        self.bitboards[player - 1] ^= bit
+        self.hash ^= ZOBRIST_KEYS[player - 1][pos]
+        self.mirrorHash ^= ZOBRIST_KEYS[player - 1][MIRROR_POSITIONS[pos]]
+        self.moveCount -= 1
+
+    def IsFull(self):
+        return self.moveCount == WIDTH * HEIGHT
+
+    def PlayableMask(self):
+        # The cell each column's next coin would land in
+        return (self.Mask() + BOTTOM_MASK) & BOARD_MASK
+
+    def ThreatMask(self, player):
+        # Empty cells where a coin of the player would win the game
+        return WinningCells(self.bitboards[player - 1], self.Mask())
+
+    def LastMove(self):
+        return self.moves[-1] if self.moves else None
+
+    def IsWinningMove(self, col, player):
+        # Would dropping a coin of the player into the column win the game?
+        pos = self.heights[col]
+        return IsLineThrough(self.bitboards[player - 1] | (1 << pos), pos)
+
+    def Winner(self):
+        if self.moves:
+            # Only the coin just played can have completed a line
+            pos = self.heights[self.moves[-1]] - 1
+            player = 1 if (self.bitboards[0] >> pos) & 1 else 2
+            if IsLineThrough(self.bitboards[player - 1], pos):
+                return player
+            return None
+        if IsWin(self.bitboards[0]):
+            return 1
+        if IsWin(self.bitboards[1]):
+            return 2
+        return None
+
+    def CountWindows(self):
+        # Same counts as GameTreePlayer.findNumberOfOpportunities2: windows
+        # holding 3, 2 or 1 coins of one player and nothing of the other.
+        player1 = [0, 0, 0, 0, 0]
+        player2 = [0, 0, 0, 0, 0]
+        b1, b2 = self.bitboards
+        for mask in WINDOW_MASKS:
+            c1 = (b1 & mask).bit_count()
+            c2 = (b2 & mask).bit_count()
+            if c2 == 0:
+                player1[c1] += 1
+            elif c1 == 0:
+                player2[c2] += 1
+        return player2[3], player2[2], player2[1], player1[3], player1[2], player1[1]
+
+
+# Indices of the windows (in WINDOW_MASKS) each bit position belongs to
+CELL_WINDOWS = tuple(
+    tuple(w for w, mask in enumerate(WINDOW_MASKS) if (mask >> pos) & 1)
+    for pos in range(WIDTH * COLUMN_BITS))
+
+# heuristicFunction3 weight of a window by its number of coins of one player
+WINDOW_WEIGHTS = (0, 10, 100, 1000, 0)
+
+
+class EvaluatedBitboard(Bitboard):
+    """
+    Bitboard that keeps the heuristicFunction3 window counts up to date.
+
+    windowCoins[p][w] is the number of coins of player p+1 in window w.
+    openWindows[p][n] is the number of windows holding n coins of player p+1
+    and none of the other player, and score is the heuristicFunction3 value
+    those totals give. A move touches at most 16 windows, and Push and Pop
+    update only those. So CountWindows and score cost O(1) instead of a scan
+    of every window.
+    """
+
+    def __init__(self):
+        Bitboard.__init__(self)
+        self.windowCoins = [[0] * len(WINDOW_MASKS), [0] * len(WINDOW_MASKS)]
+        self.openWindows = [[len(WINDOW_MASKS), 0, 0, 0, 0], [len(WINDOW_MASKS), 0, 0, 0, 0]]
+        self.score = 0
+
+    def Copy(self):
+        board = Bitboard.Copy(self)
+        board.windowCoins = [self.windowCoins[0][:], self.windowCoins[1][:]]
+        board.openWindows = [self.openWindows[0][:], self.openWindows[1][:]]
+        board.score = self.score
+        return board
+
+    def Push(self, col, player):
+        pos = self.heights[col]
+        Bitboard.Push(self, col, player)
+        self._UpdateWindows(pos, player - 1, 1)
+
+    def Pop(self):
+        pos = self.heights[self.moves[-1]] - 1
+        player = 1 if (self.bitboards[0] >> pos) & 1 else 2
+        Bitboard.Pop(self)
+        self._UpdateWindows(pos, player - 1, -1)
+
+    def _UpdateWindows(self, pos, p, delta):
+        # Add (delta=1) or remove (delta=-1) a coin of player p+1 at pos
+        mine = self.windowCoins[p]
+        theirs = self.windowCoins[1 - p]
+        myOpen = self.openWindows[p]
+        theirOpen = self.openWindows[1 - p]
+        # Positive for player 2, negative for player 1
+        sign = 1 if p == 1 else -1
+        score = self.score
+        for w in CELL_WINDOWS[pos]:
+            before = mine[w]
+            after = before + delta
+            mine[w] = after
+            other = theirs[w]
+            if other == 0:
+                myOpen[before] -= 1
+                myOpen[after] += 1
+                if before == 0:
+                    theirOpen[0] -= 1
+                elif after == 0:
+                    theirOpen[0] += 1
+                score += sign * (WINDOW_WEIGHTS[after] - WINDOW_WEIGHTS[before])
+            elif before == 0 or after == 0:
+                # The window opens to, or closes for, the other player
+                if after:
+                    theirOpen[other] -= 1
+                    score += sign * WINDOW_WEIGHTS[other]
+                else:
+                    theirOpen[other] += 1
+                    score -= sign * WINDOW_WEIGHTS[other]
+        self.score = score
+
+    def CountWindows(self):
+        player1 = self.openWindows[0]
+        player2 = self.openWindows[1]
+        return player2[3], player2[2], player2[1], player1[3], player1[2], player1[1]
@@ -0,0 +1,186 @@
+"""
+Evaluation functions for GameTreePlayer, selected by name.
+
+Every heuristic is a sum over a fixed table of windows (sets of cells). What
+a window adds depends only on how many coins of each player it holds, so a
+heuristic is given by its windows and a score table indexed by
+c1 * 5 + c2 (c1, c2 = coins of player 1 and player 2 in the window). Scores
+are from player 2's view.
+
+- heuristic3: the four-cell windows of Bitboard.WINDOW_MASKS; a window of n
+  coins of one player and none of the other is worth 10, 100 or 1000.
+- heuristic2: the same windows; 100 for three coins of one player and an
+  empty cell.
+- heuristic1: the 98 three-cell windows; 1 for three coins of one player.
+
+The four-cell table holds the 69 lines of the board and, like the grid scans
+these heuristics were first written as, the four up-right windows that wrap
+past the top row, so the scores are the same as before.
+
+The window masks and score table of a heuristic are compiled into a single
+straight-line function of the two bitboards when this module is imported,
+so evaluating a position is one expression with no loops. RegisterEvaluator
+adds new heuristics, GetEvaluator looks them up.
+"""
+from Bitboard import EvaluatedBitboard, WINDOW_MASKS, WINDOW_WEIGHTS, CellBit
+
+
+def _BuildTripleMasks():
+    # The three-cell windows in the order heuristicFunction1 scanned them:
+    # rows, columns, down-right diagonals, up-right diagonals
+    triples = []
+    for row in range(6):
+        for col in range(5):
+            triples.append(((row, col), (row, col + 1), (row, col + 2)))
+    for col in range(7):
+        for row in range(4):
+            triples.append(((row, col), (row + 1, col), (row + 2, col)))
+    for row in range(4):
+        for col in range(5):
+            triples.append(((row, col), (row + 1, col + 1), (row + 2, col + 2)))
+    for row in range(2, 6):
+        for col in range(5):
+            triples.append(((row, col), (row - 1, col + 1), (row - 2, col + 2)))
+    return tuple(CellBit(*a) | CellBit(*b) | CellBit(*c) for a, b, c in triples)
+
+
+TRIPLE_MASKS = _BuildTripleMasks()
+
+
+def ScoreTable(score):
+    # Flat table of score(c1, c2) for 0 to 4 coins of each player
+    return tuple(score(c1, c2) for c1 in range(5) for c2 in range(5))
+
+
+def _Progression(mask):
+    # (first bit, step) if the bits of the mask are evenly spaced, else None
+    bits = [pos for pos in range(mask.bit_length()) if (mask >> pos) & 1]
+    step = bits[1] - bits[0]
+    if all(b - a == step for a, b in zip(bits, bits[1:])):
+        return bits[0], step
+    return None
+
+
+def _FullWindowCount(masks, b):
+    # Expression counting the windows filled with coins of bitboard b. Windows
+    # along a line are counted all at once, by shifting b once per cell over
+    # the first bits of the windows with that step.
+    starts = {}
+    terms = []
+    for mask in masks:
+        progression = _Progression(mask)
+        if progression is None:
+            terms.append('(({0} & {1:#x}) == {1:#x})'.format(b, mask))
+        else:
+            first, step = progression
+            starts[step] = starts.get(step, 0) | (1 << first)
+    size = masks[0].bit_count()
+    for step, first in sorted(starts.items()):
+        shifted = ' & '.join('{0} >> {1}'.format(b, step * i) if i else b for i in range(size))
+        terms.append('({0} & {1:#x}).bit_count()'.format(shifted, first))
+    return ' + '.join(terms)
+
+
+def CompileWindowSum(masks, table):
+    """
+    Compile a function windowSum(b1, b2) returning the sum over the windows
+    of table[c1 * 5 + c2], for the bitboards of player 1 and player 2.
+
+    A table scoring only the windows filled by one player (all windows of
+    the same size) needs no per-window coin counts, and is compiled into
+    shift-and-mask counts of the filled windows instead.
+    """
+    size = masks[0].bit_count()
+    scored = set(index for index, score in enumerate(table) if score)
+    if all(mask.bit_count() == size for mask in masks) and scored <= {size * 5, size}:
+        terms = ['{0} * ({1})'.format(table[index], _FullWindowCount(masks, b))
+                 for index, b in ((size, 'b2'), (size * 5, 'b1')) if table[index]]
+    else:
+        terms = ['t[(b1 & {0:#x}).bit_count() * 5 + (b2 & {0:#x}).bit_count()]'.format(mask)
+                 for mask in masks]
+    source = 'def windowSum(b1, b2, t=table):\n    return (' + '\n            + '.join(terms or ['0']) + ')\n'
+    namespace = {'table': tuple(table)}
+    exec(compile(source, '<window sum>', 'exec'), namespace)
+    return namespace['windowSum']
+
+
+class Evaluator:
+    """
+    A heuristic defined by a window table and a score table.
+
+    Calling it with a Bitboard returns the score of the position. With
+    incremental set, an EvaluatedBitboard keeps the same score up to date as
+    its score attribute, which is returned instead.
+    """
+
+    def __init__(self, name, masks, table, incremental=False):
+        self.name = name
+        self.masks = masks
+        self.table = table
+        self.incremental = incremental
+        self.windowSum = CompileWindowSum(masks, table)
+
+    def __call__(self, board):
+        if self.incremental and isinstance(board, EvaluatedBitboard):
+            return board.score
+        return self.windowSum(board.bitboards[0], board.bitboards[1])
+
+    def __repr__(self):
+        return 'Evaluator({0!r})'.format(self.name)
+
+
+def _Heuristic3Score(c1, c2):
+    if c1 == 0:
+        return WINDOW_WEIGHTS[c2]
+    if c2 == 0:
+        return -WINDOW_WEIGHTS[c1]
+    return 0
+
+
+def _OpenThreeScore(c1, c2):
+    # Three coins of one player and an empty cell
+    if (c1, c2) == (0, 3):
+        return 100
+    if (c1, c2) == (3, 0):
+        return -100
+    return 0
+
+
+def _TripleScore(c1, c2):
+    # A three-cell window filled by one player
+    if (c1, c2) == (0, 3):
+        return 1
+    if (c1, c2) == (3, 0):
+        return -1
+    return 0
+
+
+EVALUATORS = {}
+
+
+def RegisterEvaluator(evaluator):
+    EVALUATORS[evaluator.name] = evaluator
+    return evaluator
+
+
+def GetEvaluator(evaluation):
+    # An Evaluator, or the registered one of that name
+    if isinstance(evaluation, Evaluator):
+        return evaluation
+    if evaluation not in EVALUATORS:
+        raise ValueError("Unknown evaluation {0!r}, expected one of {1}".format(
+            evaluation, ', '.join(sorted(EVALUATORS))))
+    return EVALUATORS[evaluation]
+
+
+RegisterEvaluator(Evaluator('heuristic1', TRIPLE_MASKS, ScoreTable(_TripleScore)))
+RegisterEvaluator(Evaluator('heuristic2', WINDOW_MASKS, ScoreTable(_OpenThreeScore)))
+RegisterEvaluator(Evaluator('heuristic3', WINDOW_MASKS, ScoreTable(_Heuristic3Score),
+                            incremental=True))
+
+# Windows with three coins of player 1 (index 0) or player 2 (index 1) and
+# an empty cell, as counted by findNumberOfOpportunities1
+OPEN_THREE_COUNTS = (
+    CompileWindowSum(WINDOW_MASKS, ScoreTable(lambda c1, c2: (c1, c2) == (3, 0))),
+    CompileWindowSum(WINDOW_MASKS, ScoreTable(lambda c1, c2: (c1, c2) == (0, 3))),
+)
@@ -1,10 +1,128 @@
 import random
 import copy
+import json
+import sys
+from collections import namedtuple
 
+from Bitboard import Bitboard, WinningCells, COLUMN_BITS
+
+# Output levels of a PrintObserver
+SILENT = 0
+MOVES = 1
+BOARDS = 2
+
+# One move of a game: moveNumber counts from 1, row is the grid row the coin
+# landed in, winner is the player who won with this move (or None)
+MoveEvent = namedtuple('MoveEvent', ['moveNumber', 'player', 'action', 'row', 'winner'])
+
+
+def FormatGameState(game):
+    # The text PrintGameState prints for a grid
+    lines = ["0 1 2 3 4 5 6", "- - - - - - -"]
+    lines.extend(' '.join(str(cell) for cell in row) for row in game)
+    return '\n'.join(lines) + '\n\n'
+
+
+class PrintObserver:
+    """
+    Writes a game as text: at MOVES every move ("Player 1 takes action 3."),
+    at BOARDS the board after every move as well, and the result at the end.
+    """
+
+    def __init__(self, level=BOARDS, stream=None):
+        self.level = level
+        # None writes to whatever sys.stdout is at the time
+        self.stream = stream
+
+    def OnMove(self, event, game):
+        stream = self.stream or sys.stdout
+        if self.level >= MOVES:
+            stream.write("Player {0} takes action {1}.\n".format(event.player, event.action))
+        if self.level >= BOARDS:
+            stream.write(FormatGameState(game))
+
+    def OnGameOver(self, winner, moves):
+        if self.level < MOVES:
+            return
+        stream = self.stream or sys.stdout
+        if winner is None:
+            stream.write("Game is drawn.\n")
+        else:
+            stream.write("Winner : Player {0}\n\n".format(winner))
+        stream.write("Moves : {0}\n".format(moves))
 
-class FourConnect:
+
+class MoveRecorder:
+    # Keeps the MoveEvents of a game in events
 
     def __init__(self):
+        self.events = []
+
+    def OnMove(self, event, game):
+        self.events.append(event)
+
+    def OnGameOver(self, winner, moves):
+        pass
+
+
+class JsonLinesObserver:
+    # Writes every move, and the result, as one JSON object per line
+
+    def __init__(self, stream):
+        self.stream = stream
+
+    def OnMove(self, event, game):
+        record = event._asdict()
+        record['type'] = 'move'
+        self.stream.write(json.dumps(record) + '\n')
+
+    def OnGameOver(self, winner, moves):
+        self.stream.write(json.dumps({'type': 'result', 'winner': winner, 'moves': moves}) + '\n')
+
+
+class BufferedSink:
+    """
+    File-like object that collects writes in memory and passes them on to the
+    underlying stream in blocks of at least bufferSize characters, and on
+    Flush or Close.
+    """
+
+    def __init__(self, stream, bufferSize=1 << 16):
+        self.stream = stream
+        self.bufferSize = bufferSize
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.bufferSize:
+            self.Flush()
+
+    def Flush(self):
+        if self.parts:
+            self.stream.write(''.join(self.parts))
+            self.parts = []
+            self.size = 0
+        self.stream.flush()
+
+    flush = Flush
+
+    def Close(self):
+        self.Flush()
+        if self.stream not in (sys.stdout, sys.stderr):
+            self.stream.close()
+
+
+class FourConnect:
+
+    def __init__(self, level=MOVES, observers=None):
+        # Every observer is told of every move and of the end of the game.
+        # Without observers a PrintObserver of the given level is used;
+        # SILENT (or an empty list of observers) writes nothing at all.
+        if observers is None:
+            observers = [PrintObserver(level)] if level > SILENT else []
+        self.observers = observers
         self._47_game = [
             [0, 0, 0, 0, 0, 0, 0],  # row 0 having columns 0 to 6 from left to right
             # row 1 having columns 0 to 6 from left to right
@@ -19,6 +137,10 @@ class FourConnect:
             [0, 0, 0, 0, 0, 0, 0]
         ]
         self.winner = None
+        # Columns played so far, in order
+        self.actions = []
+        # The same position as a Bitboard, for the Myopic player's threat tests
+        self._47_board = Bitboard()
 
     def _47_CoinRowAfterAction(self, action):
         g = self._47_game
@@ -108,6 +230,36 @@ class FourConnect:
         return self._47_CanAPlayerWin(row, col, player=2)
 
     def _47_FindMyopicMoves(self):
+        # The same lists as _47_FindMyopicMovesOnGrid, from bitboard threat masks:
+        # a move wins if it fills a cell of the player's threat mask, and loses
+        # if the cell above it is in the Game Tree player's threat mask
+        board = self._47_board
+        mask = board.Mask()
+        playable = board.PlayableMask()
+        myopicWins = WinningCells(board.bitboards[0], mask) & playable
+        gameTreeThreats = WinningCells(board.bitboards[1], mask)
+        gameTreeWins = gameTreeThreats & playable
+        losing = (gameTreeThreats >> 1) & playable
+        validAction = list()
+        losingAction = list()
+        myopicWinAction = None
+        gameTreeWinAction = None
+        for action in range(7):
+            if not board.CanPlay(action):
+                continue
+            bit = 1 << board.heights[action]
+            if losing & bit:
+                losingAction.append(action)
+            else:
+                validAction.append(action)
+            if myopicWins & bit:
+                myopicWinAction = action
+            if gameTreeWins & bit:
+                gameTreeWinAction = action
+        return myopicWinAction, gameTreeWinAction, validAction, losingAction
+
+    def _47_FindMyopicMovesOnGrid(self):
+        # The original scan of the grid, kept as the reference for _47_FindMyopicMoves
         validAction = list()
         losingAction = list()
         myopicWinAction = None
@@ -153,13 +305,19 @@ class FourConnect:
         return bestAction
 
     def _47_TakeAction(self, action, player):
-        row = self._47_CoinRowAfterAction(action)
-        assert row != -1, "Action {0} cannot be taken.".format(action)
+        board = self._47_board
+        assert board.CanPlay(action), "Action {0} cannot be taken.".format(action)
+        row = 5 - (board.heights[action] - action * COLUMN_BITS)
+        win = board.IsWinningMove(action, player)
+        board.Push(action, player)
         self._47_game[row][action] = player
-        win = self._47_CanAPlayerWin(row, action, player)
+        self.actions.append(action)
         if win == True:
             self.winner = player
-        print("Player {0} takes action {1}.".format(player, action))
+        if self.observers:
+            event = MoveEvent(len(self.actions), player, action, row, self.winner)
+            for observer in self.observers:
+                observer.OnMove(event, self._47_game)
 
     def MyopicPlayerAction(self):
         bestAction = self._47_FindBestMyopicAction()
@@ -169,6 +327,11 @@ class FourConnect:
         assert action >= 0 and action <= 6, "Invalid game tree player action. Action out of range."
         self._47_TakeAction(action, player=2)
 
+    def GameOver(self, moves):
+        # Tell the observers the game has ended after the given number of moves
+        for observer in self.observers:
+            observer.OnGameOver(self.winner, moves)
+
     def PrintGameState(self, state=None):
         game = self._47_game if state == None else state
         print(*[0, 1, 2, 3, 4, 5, 6], sep=" ")
@@ -183,6 +346,7 @@ class FourConnect:
 
     def SetCurrentState(self, gameState):
         self._47_game = copy.deepcopy(gameState)
+        self._47_board = Bitboard.FromState(gameState)
 
 
 def main():
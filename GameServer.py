@@ -0,0 +1,463 @@
+#!/usr/bin/env python3
+"""
+GameTreePlayer as a service, over TCP or a Unix socket.
+
+The protocol is JSON lines: one request object per line, one response object
+per line. Responses come back as the searches finish, not in request order;
+a request's id is echoed in its response.
+
+    {"id": 1, "board": "000...", "depth": 5, "timeBudget": 0.5}
+    {"id": 1, "bestAction": 3, "score": 120, "depth": 5, "nodes": 812,
+     "time": 0.02, "cached": false, "coalesced": false}
+
+board is 42 digits 0, 1 or 2, row by row from the top (as in Analysis.py
+packed files); a "state" grid (6 lists of 7) may be given instead. Player 2
+is to move. depth defaults to the server's depth, timeBudget (seconds) makes
+the search deepen until the budget is spent; both are capped by the server.
+{"command": "stats"} returns the server's counters. A bad request gets
+{"id": ..., "error": "..."}.
+
+The event loop only parses, looks up and answers. Searches run in a process
+pool; every worker keeps a GameTreePlayer per depth, so its transposition
+table carries over between requests. Positions are keyed by their key
+(Bitboard.Key), depth and time budget; only with symmetry=True in the
+players' settings are a position and its mirror image one:
+- answers are kept in an LRU cache of cacheSize entries,
+- requests for a position already being searched wait for that search
+  instead of starting another,
+- at most maxPending requests are in flight; beyond that the server stops
+  reading from its connections until some finish, so clients are slowed
+  down by TCP flow control instead of piling up work.
+
+Usage:
+    python3 GameServer.py --port 8765 --workers 4
+    python3 GameServer.py --load --port 8765 --requests 2000 --concurrency 32
+    python3 GameServer.py --load --local --requests 2000
+"""
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+
+from Analysis import PackBoard, UnpackBoard
+from Bitboard import Bitboard, MirrorMove
+from main import GameTreePlayer
+from Solver import RandomPosition
+
+
+class ResultCache:
+    """
+    Search results by key, evicting the least recently used beyond capacity.
+    """
+
+    def __init__(self, capacity=1 << 16):
+        self.capacity = capacity
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def Get(self, key):
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def Put(self, key, entry):
+        self.entries[key] = entry
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.capacity:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self):
+        return len(self.entries)
+
+
+# The players of a worker process by depth, and their settings (_InitWorker)
+_workerPlayers = {}
+_workerSettings = {}
+
+
+def _InitWorker(settings):
+    _workerSettings.update(settings)
+
+
+def _SearchKey(key, depth, timeBudget, maxDepth=None):
+    # Search the position of a key in a worker
+    player = _workerPlayers.get(depth)
+    if player is None:
+        player = _workerPlayers[depth] = GameTreePlayer(depth, **_workerSettings)
+    stats = player.Search(Bitboard.FromKey(key).ToState(), timeBudget, maxDepth)
+    return {
+        'bestAction': stats.bestAction,
+        'score': stats.score,
+        'depth': stats.depth,
+        'nodes': stats.nodes,
+        'time': stats.time,
+    }
+
+
+def ParseState(request):
+    """
+    The position of a request as a GetCurrentState() grid.
+
+    Raises ValueError unless it is a legal position with player 2 to move.
+    """
+    if 'board' in request:
+        board = request['board']
+        if not isinstance(board, str) or len(board) != 42 or set(board) - set('012'):
+            raise ValueError("board must be 42 digits 0, 1 or 2")
+        state = UnpackBoard(board)
+    elif 'state' in request:
+        state = request['state']
+        if not isinstance(state, list) or len(state) != 6 \
+                or any(not isinstance(row, list) or len(row) != 7 for row in state) \
+                or any(cell not in (0, 1, 2) for row in state for cell in row):
+            raise ValueError("state must be 6 rows of 7 cells 0, 1 or 2")
+    else:
+        raise ValueError("expected a board or a state")
+    if Bitboard.FromState(state).ToState() != state:
+        raise ValueError("every coin must rest on the bottom or on another coin")
+    coins1 = sum(row.count(1) for row in state)
+    coins2 = sum(row.count(2) for row in state)
+    if coins1 != coins2 + 1:
+        raise ValueError("player 2 must be to move")
+    return state
+
+
+class GameServer:
+    """
+    asyncio server answering FindBestAction requests (see the module docstring).
+
+    Parameters:
+    workers (int): Search processes (default: one per CPU).
+    cacheSize (int): Entries of the result cache.
+    maxPending (int): Requests in flight before the connections stop being read.
+    depth (int): Search depth of requests that give none.
+    maxDepth (int), maxTimeBudget (float): Caps on the depth and time budget
+        of a request. Time-budgeted searches deepen up to maxDepth.
+    settings: Further GameTreePlayer arguments for the workers' players.
+    """
+
+    def __init__(self, workers=None, cacheSize=1 << 16, maxPending=64, depth=5, maxDepth=10,
+                 maxTimeBudget=5.0, **settings):
+        self.workers = workers or os.cpu_count() or 1
+        self.depth = depth
+        self.maxDepth = maxDepth
+        self.maxTimeBudget = maxTimeBudget
+        self.maxPending = maxPending
+        # Mirror images share answers only if the players treat them as one
+        self.symmetry = settings.get('symmetry', False)
+        self.cache = ResultCache(cacheSize)
+        self.executor = ProcessPoolExecutor(self.workers, initializer=_InitWorker,
+                                            initargs=(settings,))
+        # Searches in progress by cache key, and the open connections' tasks
+        self.inFlight = {}
+        self.connections = set()
+        self.slots = None
+        self.server = None
+        self.requests = 0
+        self.errors = 0
+        self.searches = 0
+        self.coalesced = 0
+
+    async def Start(self, host='127.0.0.1', port=8765, path=None):
+        # Listen on a Unix socket if a path is given, else on TCP
+        self.slots = asyncio.Semaphore(self.maxPending)
+        if path is not None:
+            self.server = await asyncio.start_unix_server(self.HandleConnection, path)
+        else:
+            self.server = await asyncio.start_server(self.HandleConnection, host, port)
+        return self.server
+
+    async def Close(self, timeout=1.0):
+        # Stop listening, give the open connections a moment to finish, then
+        # drop them and the workers
+        if self.server is not None:
+            self.server.close()
+        if self.connections:
+            await asyncio.wait(self.connections, timeout=timeout)
+        for connection in self.connections:
+            connection.cancel()
+        self.executor.shutdown(cancel_futures=True)
+
+    async def HandleConnection(self, reader, writer):
+        self.connections.add(asyncio.current_task())
+        lock = asyncio.Lock()
+        tasks = set()
+        try:
+            while True:
+                # With maxPending requests in flight, stop reading (backpressure)
+                await self.slots.acquire()
+                try:
+                    line = await reader.readline()
+                except BaseException:
+                    self.slots.release()
+                    raise
+                if not line:
+                    self.slots.release()
+                    break
+                task = asyncio.create_task(self._Answer(line, writer, lock))
+                tasks.add(task)
+                task.add_done_callback(tasks.discard)
+            if tasks:
+                await asyncio.wait(tasks)
+        except (ConnectionError, asyncio.CancelledError):
+            # The client hung up, or the server is closing
+            pass
+        finally:
+            for task in tasks:
+                task.cancel()
+            writer.close()
+            self.connections.discard(asyncio.current_task())
+
+    async def _Answer(self, line, writer, lock):
+        try:
+            try:
+                request = json.loads(line)
+                if not isinstance(request, dict):
+                    raise ValueError("expected a JSON object")
+            except ValueError as e:
+                request = {}
+                response = {'error': str(e)}
+            else:
+                try:
+                    response = await self.Handle(request)
+                except Exception as e:
+                    # The search failed (a broken pool or an error in a worker)
+                    self.errors += 1
+                    response = {'error': str(e) or type(e).__name__}
+            if 'id' in request:
+                response = dict(response, id=request['id'])
+            async with lock:
+                writer.write((json.dumps(response) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            # The client hung up before its answer was ready
+            pass
+        finally:
+            self.slots.release()
+
+    async def Handle(self, request):
+        """
+        Answer one request.
+
+        Returns:
+        response (dict): The search result, the stats, or an error.
+        """
+        self.requests += 1
+        if request.get('command') == 'stats':
+            return self.Stats()
+        try:
+            state = ParseState(request)
+            depth = int(request.get('depth', self.depth))
+            if not 1 <= depth <= self.maxDepth:
+                raise ValueError("depth must be between 1 and {0}".format(self.maxDepth))
+            timeBudget = request.get('timeBudget')
+            if timeBudget is not None:
+                timeBudget = min(float(timeBudget), self.maxTimeBudget)
+        except (ValueError, TypeError) as e:
+            self.errors += 1
+            return {'error': str(e)}
+
+        board = Bitboard.FromState(state)
+        if self.symmetry:
+            key, mirrored = board.CanonicalKey()
+        else:
+            key, mirrored = board.Key(), False
+        cacheKey = key, depth, timeBudget
+        result = self.cache.Get(cacheKey)
+        cached = result is not None
+        coalesced = False
+        if not cached:
+            search = self.inFlight.get(cacheKey)
+            if search is None:
+                search = asyncio.ensure_future(self._Search(cacheKey))
+                self.inFlight[cacheKey] = search
+            else:
+                self.coalesced += 1
+                coalesced = True
+            # Shielded: a client hanging up does not cancel a shared search
+            result = await asyncio.shield(search)
+        response = dict(result, cached=cached, coalesced=coalesced)
+        if mirrored and response['bestAction'] is not None:
+            response['bestAction'] = MirrorMove(response['bestAction'])
+        return response
+
+    async def _Search(self, cacheKey):
+        self.searches += 1
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(
+                self.executor, _SearchKey, *cacheKey, self.maxDepth)
+            self.cache.Put(cacheKey, result)
+            return result
+        finally:
+            del self.inFlight[cacheKey]
+
+    def Stats(self):
+        return {
+            'requests': self.requests,
+            'errors': self.errors,
+            'searches': self.searches,
+            'coalesced': self.coalesced,
+            'inFlight': len(self.inFlight),
+            'cacheEntries': len(self.cache),
+            'cacheHits': self.cache.hits,
+            'cacheMisses': self.cache.misses,
+            'cacheEvictions': self.cache.evictions,
+            'workers': self.workers,
+        }
+
+
+def Percentile(values, fraction):
+    # The value below which the given fraction of the sorted values lie
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def LoadPositions(count=200, seed=0, moveCounts=range(1, 22, 2)):
+    # Packed boards of random positions with player 2 to move
+    rng = random.Random(seed)
+    boards = []
+    while len(boards) < count:
+        position = RandomPosition(rng, rng.choice(moveCounts))
+        if position is not None:
+            boards.append(PackBoard(position[0].ToState()))
+    return boards
+
+
+async def RunLoad(host='127.0.0.1', port=8765, path=None, requests=1000, concurrency=16,
+                  positions=200, depth=4, timeBudget=None, seed=0):
+    """
+    Load generator: concurrency connections, each sending one request at a
+    time, for requests requests in total, drawn from a pool of random
+    positions (repeats hit the cache or join a search in progress).
+
+    Returns:
+    report (dict): requests, errors, cached and coalesced answers, wall time,
+    throughput (requests per second) and latency percentiles (seconds).
+    """
+    boards = LoadPositions(positions, seed)
+    rng = random.Random(seed + 1)
+    latencies = []
+    counts = {'errors': 0, 'cached': 0, 'coalesced': 0}
+    remaining = requests
+
+    async def Client(clientId):
+        nonlocal remaining
+        if path is not None:
+            reader, writer = await asyncio.open_unix_connection(path)
+        else:
+            reader, writer = await asyncio.open_connection(host, port)
+        try:
+            while remaining > 0:
+                remaining -= 1
+                request = {'id': clientId, 'board': rng.choice(boards), 'depth': depth}
+                if timeBudget is not None:
+                    request['timeBudget'] = timeBudget
+                startTime = time.perf_counter()
+                writer.write((json.dumps(request) + '\n').encode())
+                await writer.drain()
+                response = json.loads(await reader.readline())
+                latencies.append(time.perf_counter() - startTime)
+                if 'error' in response:
+                    counts['errors'] += 1
+                counts['cached'] += bool(response.get('cached'))
+                counts['coalesced'] += bool(response.get('coalesced'))
+        finally:
+            writer.close()
+            await writer.wait_closed()
+
+    startTime = time.perf_counter()
+    await asyncio.gather(*(Client(i) for i in range(concurrency)))
+    elapsed = time.perf_counter() - startTime
+    latencies.sort()
+    return dict(counts, **{
+        'requests': len(latencies),
+        'concurrency': concurrency,
+        'time': elapsed,
+        'throughput': len(latencies) / elapsed if elapsed > 0 else 0.0,
+        'p50': Percentile(latencies, 0.50),
+        'p90': Percentile(latencies, 0.90),
+        'p99': Percentile(latencies, 0.99),
+        'max': latencies[-1] if latencies else None,
+    })
+
+
+async def _Serve(args):
+    server = GameServer(args.workers, args.cache_size, args.max_pending, args.depth,
+                        args.max_depth, args.max_time_budget, positionCache=args.position_cache)
+    await server.Start(args.host, args.port, args.unix)
+    print("Serving on {0}".format(args.unix or "{0}:{1}".format(args.host, args.port)))
+    try:
+        await server.server.serve_forever()
+    finally:
+        await server.Close()
+
+
+async def _Load(args):
+    server = None
+    if args.local:
+        # Serve in this process, so one command measures the whole round trip
+        server = GameServer(args.workers, args.cache_size, args.max_pending, args.depth,
+                            args.max_depth, args.max_time_budget,
+                            positionCache=args.position_cache)
+        await server.Start(args.host, args.port, args.unix)
+    try:
+        report = await RunLoad(args.host, args.port, args.unix, args.requests, args.concurrency,
+                               args.positions, args.depth, args.time_budget, args.seed)
+        if server is not None:
+            report['server'] = server.Stats()
+        print(json.dumps(report))
+    finally:
+        if server is not None:
+            await server.Close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--unix', default=None,
+                        help='Unix socket path to use instead of TCP')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='search processes (default: one per CPU)')
+    parser.add_argument('--cache-size', type=int, default=1 << 16)
+    parser.add_argument('--max-pending', type=int, default=64,
+                        help='requests in flight before connections stop being read')
+    parser.add_argument('--depth', type=int, default=5,
+                        help='search depth (default of requests, or of the load generator)')
+    parser.add_argument('--max-depth', type=int, default=10)
+    parser.add_argument('--max-time-budget', type=float, default=5.0)
+    parser.add_argument('--position-cache', default=None,
+                        help='position cache file shared by the workers (see PositionCache.py)')
+    parser.add_argument('--load', action='store_true',
+                        help='run the load generator against a server')
+    parser.add_argument('--local', action='store_true',
+                        help='with --load, start the server in the same process')
+    parser.add_argument('--requests', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=16,
+                        help='connections of the load generator')
+    parser.add_argument('--positions', type=int, default=200,
+                        help='random positions the load generator draws from')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='time budget of the load generator requests')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+    try:
+        asyncio.run(_Load(args) if args.load else _Serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Forced-win search: does player 2, to move, win within N plies against any
+defence?
+
+This is an AND/OR search on bitboards with no heuristic scores. Player 2
+(the attacker) needs one move that wins; player 1 (the defender) loses only
+if every reply loses. Threats cut the tree down:
+- a win on the next coin ends the search at once,
+- a threat of the other side that is playable now must be blocked, so it is
+  the only move (two such threats decide the position),
+- the attacker never plays right under a cell where the defender would win,
+- the defender facing two playable threats is lost.
+Attacker moves are tried in the order of the threats they create. Proofs and
+disproofs are kept per position with the plies they hold for, and the
+search deepens two plies at a time, so the first win found is the shortest.
+
+With threatsOnly the attacker only plays forced blocks and moves that add a
+threat (threat-space search). Wins found are still proofs, but not finding
+one then proves nothing ("unknown").
+
+Usage: python3 MateSearch.py --plies 5 --workers 4 testcases/*.csv
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import glob
+import json
+import os
+import time
+
+from Bitboard import Bitboard, BOTTOM_MASK, BOARD_MASK, WinningCells
+from Solver import COLUMN_ORDER, COLUMN_MASKS
+
+# The test cases next to this file, wherever the search is run from
+TESTCASES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'testcases', '*.csv')
+
+
+class MateSearch:
+    """
+    Search state (node count and proof tables) for any number of positions.
+    """
+
+    def __init__(self, threatsOnly=False):
+        self.threatsOnly = threatsOnly
+        self.nodes = 0
+        # Attacker-to-move positions: the fewest plies a win was proven in,
+        # the most plies no win was found in, and the winning move
+        self.proven = {}
+        self.disproven = {}
+        self.bestMoves = {}
+
+    def _Moves(self, moves):
+        # The columns of a set of playable cells, center first
+        return [(col, moves & COLUMN_MASKS[col]) for col in COLUMN_ORDER
+                if moves & COLUMN_MASKS[col]]
+
+    def Attack(self, attacker, defender, mask, plies):
+        # True if the attacker, to move, wins within plies
+        self.nodes += 1
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        wins = WinningCells(attacker, mask) & possible
+        if wins:
+            return plies >= 1
+        if plies < 3 or not possible:
+            return False
+        key = (mask + BOTTOM_MASK) | attacker
+        if self.proven.get(key, 99) <= plies:
+            return True
+        if self.disproven.get(key, -1) >= plies:
+            return False
+
+        defenderThreats = WinningCells(defender, mask)
+        forced = defenderThreats & possible
+        if forced:
+            if forced & (forced - 1):
+                self.disproven[key] = 99
+                return False
+            moves = forced
+        else:
+            moves = possible
+        moves &= ~(defenderThreats >> 1)
+
+        threats = WinningCells(attacker, mask).bit_count()
+        candidates = []
+        for col, move in self._Moves(moves):
+            created = WinningCells(attacker | move, mask | move).bit_count()
+            if self.threatsOnly and not forced and created <= threats:
+                continue
+            candidates.append((-created, len(candidates), col, move))
+        candidates.sort()
+
+        for _, _, col, move in candidates:
+            if self.Defend(attacker | move, defender, mask | move, plies - 1):
+                self.proven[key] = plies
+                self.bestMoves[key] = col
+                return True
+        if not self.threatsOnly:
+            self.disproven[key] = max(plies, self.disproven.get(key, -1))
+        return False
+
+    def Defend(self, attacker, defender, mask, plies):
+        # True if the attacker wins within plies whatever the defender, to move, plays
+        self.nodes += 1
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        if not possible or WinningCells(defender, mask) & possible:
+            return False
+        attackerWins = WinningCells(attacker, mask) & possible
+        if attackerWins:
+            if attackerWins & (attackerWins - 1):
+                return plies >= 2
+            possible = attackerWins
+        for _, move in self._Moves(possible):
+            if not self.Attack(attacker, defender | move, mask | move, plies - 1):
+                return False
+        return True
+
+    def FindWin(self, currentState, maxPlies=5):
+        """
+        Search a GetCurrentState() grid with player 2 to move.
+
+        Returns:
+        plies (int or None): The length of the shortest forced win found, in
+        plies counted from the root (player 2's winning coin included), or
+        None if there is none within maxPlies.
+        """
+        board = Bitboard.FromState(currentState)
+        attacker, defender = board.bitboards[1], board.bitboards[0]
+        mask = board.Mask()
+        for plies in range(1, maxPlies + 1, 2):
+            if self.Attack(attacker, defender, mask, plies):
+                return plies
+        return None
+
+    def Line(self, currentState, plies):
+        """
+        The main line of a proven win: player 2's winning moves, and for
+        player 1 the reply that holds out longest (the first one in
+        center-first order on ties).
+
+        Returns:
+        line (list of int): Columns, starting with player 2's move.
+        """
+        board = Bitboard.FromState(currentState)
+        attacker, defender = board.bitboards[1], board.bitboards[0]
+        mask = board.Mask()
+        line = []
+        while plies > 0:
+            possible = (mask + BOTTOM_MASK) & BOARD_MASK
+            wins = WinningCells(attacker, mask) & possible
+            if wins:
+                line.append(self._Moves(wins)[0][0])
+                break
+            key = (mask + BOTTOM_MASK) | attacker
+            if key not in self.bestMoves:
+                self.Attack(attacker, defender, mask, plies)
+            col = self.bestMoves[key]
+            move = possible & COLUMN_MASKS[col]
+            attacker |= move
+            mask |= move
+            line.append(col)
+            plies -= 2
+            possible = (mask + BOTTOM_MASK) & BOARD_MASK
+            longest = None
+            for col, move in self._Moves(possible):
+                for reply in range(1, plies + 1, 2):
+                    if self.Attack(attacker, defender | move, mask | move, reply):
+                        break
+                if longest is None or reply > longest[0]:
+                    longest = reply, col, move
+            _, col, move = longest
+            defender |= move
+            mask |= move
+            line.append(col)
+        return line
+
+
+def SolveTestcase(path, maxPlies=5, threatsOnly=False):
+    """
+    Returns:
+    report (dict): testcase, result ('win', 'no win', or 'unknown' when a
+    threats-only search found nothing), plies, line, nodes and time.
+    """
+    from main import LoadTestcaseStateFromCSVfile
+    currentState = LoadTestcaseStateFromCSVfile(path)
+    search = MateSearch(threatsOnly)
+    startTime = time.perf_counter()
+    plies = search.FindWin(currentState, maxPlies)
+    line = search.Line(currentState, plies) if plies is not None else None
+    if plies is not None:
+        result = 'win'
+    else:
+        result = 'unknown' if threatsOnly else 'no win'
+    return {
+        'testcase': path,
+        'result': result,
+        'plies': plies,
+        'line': line,
+        'nodes': search.nodes,
+        'time': time.perf_counter() - startTime,
+    }
+
+
+def TestcasePaths(pattern=TESTCASES):
+    # The test case files matching pattern, sorted; an error if there are none
+    paths = sorted(glob.glob(pattern))
+    if not paths:
+        raise FileNotFoundError("no test cases match {0}".format(pattern))
+    return paths
+
+
+def RunMateSearch(paths, maxPlies=5, threatsOnly=False, workers=None):
+    # Solve every test case in a worker process, yielding reports in order
+    with ProcessPoolExecutor(workers) as executor:
+        yield from executor.map(SolveTestcase, paths, [maxPlies] * len(paths),
+                                [threatsOnly] * len(paths))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('testcases', nargs='*',
+                        help='CSV board files with player 2 to move (default: the testcases/ next to this file)')
+    parser.add_argument('--plies', type=int, default=5,
+                        help='longest win searched for, player 2 moving first')
+    parser.add_argument('--threats-only', action='store_true',
+                        help='only search attacking moves that add a threat')
+    parser.add_argument('--workers', type=int, default=None)
+    args = parser.parse_args()
+    paths = args.testcases or TestcasePaths()
+    proven = 0
+    for report in RunMateSearch(paths, args.plies, args.threats_only, args.workers):
+        proven += report['result'] == 'win'
+        print(json.dumps(report))
+    print("Forced win within {0} plies in {1} of {2} test cases".format(
+        args.plies, proven, len(paths)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+from Bitboard import WIDTH, COLUMN_BITS
+
+# Static order: center column first, then outwards
+CENTER_ORDER = (3, 2, 4, 1, 5, 0, 6)
+
+
+class MoveOrdering:
+    """
+    Orders the moves of an interior search node, cheapest tests first:
+
+    1. Immediate wins of the player to move, read off the bitboard threat mask.
+    2. Blocks of the opponent's immediate wins.
+    3. The best move stored in the transposition table.
+    4. The killer moves of this ply (the last two moves that caused a cutoff
+       at the same distance from the root).
+    5. Everything else, by history score (how often, and how deep, the cell
+       caused a cutoff for this player), ties broken by CENTER_ORDER.
+
+    No moves are made and no board is scanned. Killers are cleared for every
+    search, history scores are halved so recent searches count most.
+    """
+
+    def __init__(self, maxPly=WIDTH * 6):
+        self.maxPly = maxPly
+        self.killers = [[None, None] for _ in range(maxPly + 1)]
+        # history[player - 1][bit position of the cell]
+        self.history = [[0] * (WIDTH * COLUMN_BITS), [0] * (WIDTH * COLUMN_BITS)]
+
+    def NewSearch(self):
+        for killers in self.killers:
+            killers[0] = killers[1] = None
+        for scores in self.history:
+            for i in range(len(scores)):
+                scores[i] >>= 1
+
+    def OrderMoves(self, currentState, player, ply, ttMove=None, candidates=None):
+        """
+        Returns the valid actions of currentState (a Bitboard) in the order to
+        search them, for the given player to move at the given ply.
+
+        candidates, a mask of playable cells from Threats.ForcedMoves, limits
+        the actions to those cells. There are then no wins or blocks to look for.
+        """
+        heights = currentState.heights
+        history = self.history[player - 1]
+        if candidates is None:
+            actions = [col for col in CENTER_ORDER if currentState.CanPlay(col)]
+        else:
+            actions = [col for col in CENTER_ORDER
+                       if currentState.CanPlay(col) and (candidates >> heights[col]) & 1]
+        actions.sort(key=lambda col: history[heights[col]], reverse=True)
+
+        first = []
+        if candidates is None:
+            playable = currentState.PlayableMask()
+            wins = currentState.ThreatMask(player) & playable
+            blocks = currentState.ThreatMask(3 - player) & playable
+        else:
+            wins = blocks = 0
+        if wins or blocks:
+            for col in actions:
+                if (wins >> heights[col]) & 1:
+                    first.append(col)
+            for col in actions:
+                if (blocks >> heights[col]) & 1 and col not in first:
+                    first.append(col)
+        if ttMove in actions and ttMove not in first:
+            first.append(ttMove)
+        if ply <= self.maxPly:
+            for killer in self.killers[ply]:
+                if killer in actions and killer not in first:
+                    first.append(killer)
+        if not first:
+            return actions
+        return first + [col for col in actions if col not in first]
+
+    def RecordCutoff(self, currentState, player, ply, action, depth):
+        # Called with the move taken back, so heights gives the cell it filled
+        if ply <= self.maxPly:
+            killers = self.killers[ply]
+            if killers[0] != action:
+                killers[1] = killers[0]
+                killers[0] = action
+        self.history[player - 1][currentState.heights[action]] += depth * depth
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Opening book: best moves for player 2 in every early position, precomputed
+offline and looked up by binary search over a memory-mapped file.
+
+File layout (little endian):
+    header  16 bytes: magic b'FCBK', version (u16), max ply (u16),
+                      search depth (u32), record count (u32)
+    records 16 bytes each, sorted by key:
+                      position key (u64, Bitboard.CanonicalKey), score (i32),
+                      best move (i8, for the position of the key), 3 bytes padding
+
+A position and its mirror image are stored once, under the canonical key.
+
+Opening a book reads only the header. Lookups touch a handful of pages, and
+the pages are shared by every process that maps the same file.
+
+Usage: python3 OpeningBook.py --plies 5 --depth 8 --output book.bin
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import mmap
+import struct
+import time
+
+from Bitboard import Bitboard, MirrorMove
+
+MAGIC = b'FCBK'
+VERSION = 2
+HEADER = struct.Struct('<4sHHII')
+RECORD = struct.Struct('<Qib3x')
+KEY = struct.Struct('<Q')
+
+
+class PositionTable:
+    """
+    Read-only view of a sorted (position key, score, best move) file.
+    """
+
+    def __init__(self, path, magic=MAGIC):
+        self.path = path
+        with open(path, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        fileMagic, version, self.maxPly, self.depth, self.count = HEADER.unpack_from(self.data, 0)
+        if fileMagic != magic or version != VERSION:
+            raise ValueError("{0} is not a position table of this version".format(path))
+        if len(self.data) < HEADER.size + self.count * RECORD.size:
+            raise ValueError("{0} is truncated".format(path))
+
+    def __len__(self):
+        return self.count
+
+    def Close(self):
+        self.data.close()
+
+    def Find(self, key):
+        """
+        Binary search for a position key.
+
+        Returns:
+        (bestMove, score) if the key is in the table, otherwise None.
+        """
+        data = self.data
+        lo = 0
+        hi = self.count
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            offset = HEADER.size + mid * RECORD.size
+            midKey = KEY.unpack_from(data, offset)[0]
+            if midKey < key:
+                lo = mid + 1
+            elif midKey > key:
+                hi = mid
+            else:
+                _, score, bestMove = RECORD.unpack_from(data, offset)
+                return bestMove, score
+        return None
+
+    def Probe(self, currentState):
+        # Look up a Bitboard, mirroring the stored move back if the key is
+        # that of the mirror image; the move is checked to be playable
+        key, mirrored = currentState.CanonicalKey()
+        entry = self.Find(key)
+        if entry is None:
+            return None
+        bestMove, score = entry
+        if mirrored:
+            bestMove = MirrorMove(bestMove)
+        if currentState.CanPlay(bestMove):
+            return bestMove, score
+        return None
+
+
+def WritePositionTable(path, records, maxPly, depth, magic=MAGIC):
+    """
+    Write (key, bestMove, score) records, sorted by key, to a position table file.
+    """
+    records = sorted(records)
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(magic, VERSION, maxPly, depth, len(records)))
+        for key, bestMove, score in records:
+            f.write(RECORD.pack(key, score, bestMove))
+
+
+# Tables opened in this process, by path
+_openTables = {}
+
+
+def LoadPositionTable(path, tableClass=None):
+    # Open a table file once per process and share it between players
+    table = _openTables.get(path)
+    if table is None:
+        table = _openTables[path] = (tableClass or PositionTable)(path)
+    return table
+
+
+def LoadOpeningBook(path):
+    return LoadPositionTable(path)
+
+
+def EnumerateBookPositions(maxPly):
+    """
+    All distinct positions with player 2 to move and at most maxPly coins,
+    reachable from the empty board with player 1 moving first and no one
+    having won yet. Of a position and its mirror image only one is listed.
+
+    Returns:
+    states (list of lists of lists): GetCurrentState() grids.
+    """
+    seen = set()
+    states = []
+    board = Bitboard()
+
+    def Visit(player):
+        if board.moveCount % 2 == 1:
+            key = board.CanonicalKey()[0]
+            if key in seen:
+                return
+            seen.add(key)
+            states.append(board.ToState())
+        if board.moveCount >= maxPly:
+            return
+        for col in range(7):
+            if board.CanPlay(col) and not board.IsWinningMove(col, player):
+                board.Push(col, player)
+                Visit(3 - player)
+                board.Pop()
+
+    Visit(1)
+    return states
+
+
+_builderPlayer = None
+
+
+def _SearchBookPosition(args):
+    global _builderPlayer
+    from main import GameTreePlayer
+    state, depth = args
+    if _builderPlayer is None or _builderPlayer.cutOffDepth != depth:
+        _builderPlayer = GameTreePlayer(depth, 1 << 20)
+    stats = _builderPlayer.Search(state)
+    key, mirrored = Bitboard.FromState(state).CanonicalKey()
+    bestAction = MirrorMove(stats.bestAction) if mirrored else stats.bestAction
+    return key, bestAction, stats.score
+
+
+def BuildOpeningBook(path, maxPly=5, depth=8, workers=None):
+    """
+    Search every book position to the given depth and write the book.
+
+    Returns:
+    count (int): The number of positions written.
+    """
+    states = EnumerateBookPositions(maxPly)
+    tasks = [(state, depth) for state in states]
+    with ProcessPoolExecutor(workers) as executor:
+        records = list(executor.map(_SearchBookPosition, tasks, chunksize=16))
+    WritePositionTable(path, records, maxPly, depth)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--plies', type=int, default=5,
+                        help='book positions have at most this many coins')
+    parser.add_argument('--depth', type=int, default=8,
+                        help='search depth for each position')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='book.bin')
+    args = parser.parse_args()
+    startTime = time.time()
+    count = BuildOpeningBook(args.output, args.plies, args.depth, args.workers)
+    print("Wrote {0} positions to {1} in {2:.1f}s".format(
+        count, args.output, time.time() - startTime))
+
+
+if __name__ == '__main__':
+    main()
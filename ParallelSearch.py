@@ -0,0 +1,178 @@
+#!/usr/bin/env python3
+"""
+Root-split parallel alpha-beta search for a single move.
+
+The search follows the young brothers wait idea at the root: the first root
+move (the eldest brother) is searched in this process with a full window.
+Its score becomes alpha for the other root moves, which are then searched at
+the same time in worker processes.
+
+A move scoring above alpha gets its exact score, because beta stays infinite.
+A move that cannot beat alpha only gets an upper bound, and the serial search
+learns the same about it. So the action chosen (the first root move, in the
+serial order, with the best score) is the one SearchRoot returns at the same
+depth, that is the one GameTreePlayer(solverThreshold=0) picks. (With the
+default threshold GameTreePlayer solves positions with few empty cells
+exactly, and may pick another move.) The exception is reuse of transposition
+table entries: these differ between the processes and the serial player. With transposition tables
+disabled both searches give identical moves. With tables on they differ only
+where one of them reused a deeper stored result. That is the same kind of
+difference two serial players with different table contents show.
+
+Every worker keeps its own GameTreePlayer, and with it its transposition
+table, for as long as the searcher is open. All players, the serial one of
+CompareWithSerial included, search with the heuristic and never switch to
+the endgame solver (solverThreshold=0).
+
+Usage: python3 ParallelSearch.py --depth 7 --workers 4 testcases/*.csv
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import json
+import os
+import time
+
+from main import GameTreePlayer, SearchStats, LoadTestcaseStateFromCSVfile
+
+# The player of a worker process, created by _InitWorker
+_workerPlayer = None
+
+
+def _InitWorker(cutOffDepth, transpositionTableSize):
+    global _workerPlayer
+    _workerPlayer = GameTreePlayer(cutOffDepth, transpositionTableSize, solverThreshold=0)
+
+
+def _SearchRootMove(currentState, action, depth, alpha):
+    # Search one root move in a worker with the window (alpha, +inf)
+    player = _workerPlayer
+    board = player.boardClass.FromState(currentState)
+    player.StartSearch(board)
+    player.MakeMove(board, action, 2)
+    eval = player.MinimaxAlphaBeta(board, depth - 1, alpha, float('inf'), False)
+    return action, eval, player.stats.nodes
+
+
+class ParallelSearcher:
+    """
+    Searches one position with several worker processes.
+
+    Use it as a context manager, or call Close, to shut the workers down.
+    """
+
+    def __init__(self, workers=None, cutOffDepth=3, transpositionTableSize=1 << 18):
+        self.workers = workers or os.cpu_count() or 1
+        self.cutOffDepth = cutOffDepth
+        # Searches the eldest brother in this process
+        self.player = GameTreePlayer(cutOffDepth, transpositionTableSize, solverThreshold=0)
+        self.executor = ProcessPoolExecutor(
+            self.workers, initializer=_InitWorker,
+            initargs=(cutOffDepth, transpositionTableSize))
+        self.lastSearchStats = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def Close(self):
+        self.executor.shutdown()
+
+    def FindBestAction(self, currentState):
+        return self.Search(currentState).bestAction
+
+    def Search(self, currentState, depth=None):
+        """
+        Search the given state (player 2 to move) to depth plies (default cutOffDepth).
+
+        Returns:
+        stats (SearchStats): The best action, its score, and the nodes of all
+        processes together.
+        """
+        depth = depth or self.cutOffDepth
+        player = self.player
+        board = player.boardClass.FromState(currentState)
+        stats = SearchStats()
+        stats.depth = depth
+        startTime = time.perf_counter()
+
+        rootActions = player.OrderActions(board, True)
+        player.StartSearch(board)
+        eldest = rootActions[0]
+        player.MakeMove(board, eldest, 2)
+        alpha = player.MinimaxAlphaBeta(
+            board, depth - 1, -float('inf'), float('inf'), False)
+        player.UnmakeMove(board)
+        stats.nodes = player.stats.nodes
+
+        scores = {eldest: alpha}
+        futures = [self.executor.submit(_SearchRootMove, currentState, action, depth, alpha)
+                   for action in rootActions[1:]]
+        for future in futures:
+            action, eval, nodes = future.result()
+            scores[action] = eval
+            stats.nodes += nodes
+
+        # First root move, in search order, with the best score
+        stats.bestAction = eldest
+        stats.score = alpha
+        for action in rootActions:
+            if scores[action] > stats.score:
+                stats.bestAction = action
+                stats.score = scores[action]
+
+        stats.time = time.perf_counter() - startTime
+        self.lastSearchStats = stats
+        return stats
+
+
+def CompareWithSerial(currentState, depth, workers=None, transpositionTableSize=1 << 18):
+    """
+    Search a state serially with MinimaxAlphaBeta and in parallel, both starting
+    with empty transposition tables.
+
+    Returns:
+    report (dict): Both moves and scores, the speedup (serial time / parallel
+    time) and the search overhead (extra nodes searched in parallel, as a
+    fraction of the serial nodes).
+    """
+    serial = GameTreePlayer(depth, transpositionTableSize, solverThreshold=0).Search(currentState)
+    with ParallelSearcher(workers, depth, transpositionTableSize) as searcher:
+        # Start the workers before timing the search
+        list(searcher.executor.map(abs, range(searcher.workers)))
+        parallel = searcher.Search(currentState)
+    return {
+        'depth': depth,
+        'workers': searcher.workers,
+        'serialAction': serial.bestAction,
+        'parallelAction': parallel.bestAction,
+        'serialScore': serial.score,
+        'parallelScore': parallel.score,
+        'serialNodes': serial.nodes,
+        'parallelNodes': parallel.nodes,
+        'serialTime': serial.time,
+        'parallelTime': parallel.time,
+        'speedup': serial.time / parallel.time if parallel.time > 0 else 0.0,
+        'overhead': parallel.nodes / serial.nodes - 1 if serial.nodes else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('testcases', nargs='*', default=['testcases/testcase.csv'],
+                        help='CSV board files (player 2 to move)')
+    parser.add_argument('--depth', type=int, default=7)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--transposition-table-size', type=int, default=1 << 18,
+                        help='entries per process, 0 disables the tables')
+    args = parser.parse_args()
+    for path in args.testcases:
+        report = CompareWithSerial(LoadTestcaseStateFromCSVfile(path), args.depth,
+                                   args.workers, args.transposition_table_size)
+        report['testcase'] = path
+        print(json.dumps(report))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,222 @@
+#!/usr/bin/env python3
+"""
+Persistent position cache: search results shared by every process on the
+machine through one memory-mapped file.
+
+File layout (little endian):
+    header  16 bytes: magic b'FCPC', version (u16), slots per bucket (u16),
+                      bucket count (u32), 4 bytes padding
+    buckets each 8 bytes of bucket header (clock hand, u8, and padding)
+            followed by the slots of the bucket, 24 bytes each:
+                      slot key (u64), score (i32), best move (u8, 255 for
+                      none), flags (u8), reference bit (u8), 1 byte padding,
+                      check (u64)
+
+The slot key packs the position key (Bitboard.Key, 49 bits), the search
+depth (6 bits) and a 9-bit variant for the player's settings, so players with
+different evaluators do not share results. Only players with symmetry on key
+by Bitboard.CanonicalKey, so that a position and its mirror image share a
+slot. The file is created at its full size and never grows.
+
+A key maps to one bucket. A bucket is full once all its slots are taken;
+storing another key then evicts with the clock algorithm: the hand sweeps
+the slots, clearing reference bits (set by every hit) until it finds a slot
+not used since the last sweep.
+
+Any number of processes may read and write the file at once. A writer locks
+its bucket (an fcntl lock on the bucket's first byte, and a thread lock
+within the process). Readers take no lock. Every slot carries a check value
+computed from its contents, so a reader that catches a slot half written
+sees a mismatch and treats it as a miss.
+
+Put the file on /dev/shm to keep it in memory only.
+
+Usage: python3 PositionCache.py cache.bin --stats
+"""
+import argparse
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import zlib
+
+MAGIC = b'FCPC'
+VERSION = 1
+HEADER = struct.Struct('<4sHHI4x')
+BUCKET_HEADER = struct.Struct('<B7x')
+SLOT = struct.Struct('<QiBBBxQ')
+REFERENCE_OFFSET = 14
+NO_MOVE = 255
+
+# Flags of a slot
+SOLVED = 1
+
+_MASK64 = (1 << 64) - 1
+
+
+def SlotKey(key, depth, variant=0):
+    # A 49-bit canonical position key, a depth below 64 and a 9-bit variant
+    return key | (depth << 49) | ((variant & 0x1FF) << 55)
+
+
+def Variant(*settings):
+    # A 9-bit tag of the settings that change search results
+    return zlib.crc32(repr(settings).encode()) & 0x1FF
+
+
+def _Check(slotKey, score, move, flags):
+    x = (slotKey ^ ((score & 0xFFFFFFFF) << 11) ^ (move << 43) ^ (flags << 51)) & _MASK64
+    x = (x * 0x9E3779B97F4A7C15) & _MASK64
+    return (x ^ (x >> 29)) | 1
+
+
+class PositionCache:
+    """
+    Fixed-size, set-associative result cache in a shared file (see the module
+    docstring). Lookup and Store take slot keys made by SlotKey.
+
+    Counters of this process: hits, misses, stores, evictions.
+    """
+
+    def __init__(self, path, buckets=1 << 16, slotsPerBucket=8):
+        # Open the file, creating it with the given size if it does not exist
+        # (an existing file keeps its own size)
+        self.path = path
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, HEADER.size, 0)
+        try:
+            if os.fstat(self.fd).st_size == 0:
+                size = HEADER.size + buckets * (BUCKET_HEADER.size + slotsPerBucket * SLOT.size)
+                os.ftruncate(self.fd, size)
+                os.pwrite(self.fd, HEADER.pack(MAGIC, VERSION, slotsPerBucket, buckets), 0)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, HEADER.size, 0)
+        self.data = mmap.mmap(self.fd, 0)
+        magic, version, self.slotsPerBucket, self.buckets = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC or version != VERSION:
+            self.Close()
+            raise ValueError("{0} is not a position cache of this version".format(path))
+        self.bucketSize = BUCKET_HEADER.size + self.slotsPerBucket * SLOT.size
+        if len(self.data) < HEADER.size + self.buckets * self.bucketSize:
+            self.Close()
+            raise ValueError("{0} is truncated".format(path))
+        # fcntl locks belong to the process, this one keeps its threads apart
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+
+    def Close(self):
+        if getattr(self, 'data', None) is not None:
+            self.data.close()
+            self.data = None
+        os.close(self.fd)
+
+    def __len__(self):
+        # Number of slots
+        return self.buckets * self.slotsPerBucket
+
+    def _Bucket(self, slotKey):
+        h = (slotKey * 0x9E3779B97F4A7C15) & _MASK64
+        return HEADER.size + (h >> 32) % self.buckets * self.bucketSize
+
+    def Lookup(self, slotKey):
+        """
+        Returns:
+        (bestMove, score, flags) stored under the slot key, or None.
+        """
+        data = self.data
+        offset = self._Bucket(slotKey) + BUCKET_HEADER.size
+        for _ in range(self.slotsPerBucket):
+            key, score, move, flags, _, check = SLOT.unpack_from(data, offset)
+            if key == slotKey and check == _Check(key, score, move, flags):
+                data[offset + REFERENCE_OFFSET] = 1
+                self.hits += 1
+                return (None if move == NO_MOVE else move), score, flags
+            offset += SLOT.size
+        self.misses += 1
+        return None
+
+    def Store(self, slotKey, bestMove, score, flags=0):
+        data = self.data
+        bucket = self._Bucket(slotKey)
+        move = NO_MOVE if bestMove is None else bestMove
+        entry = SLOT.pack(slotKey, score, move, flags, 1, _Check(slotKey, score, move, flags))
+        first = bucket + BUCKET_HEADER.size
+        with self.lock:
+            fcntl.lockf(self.fd, fcntl.LOCK_EX, 1, bucket)
+            try:
+                target = None
+                for i in range(self.slotsPerBucket):
+                    key = struct.unpack_from('<Q', data, first + i * SLOT.size)[0]
+                    if key == slotKey or key == 0:
+                        target = i
+                        break
+                if target is None:
+                    target = self._Sweep(bucket, first)
+                    self.evictions += 1
+                data[first + target * SLOT.size:first + (target + 1) * SLOT.size] = entry
+                self.stores += 1
+            finally:
+                fcntl.lockf(self.fd, fcntl.LOCK_UN, 1, bucket)
+
+    def _Sweep(self, bucket, first):
+        # Clock eviction in a full bucket: returns the slot to replace
+        data = self.data
+        hand = BUCKET_HEADER.unpack_from(data, bucket)[0] % self.slotsPerBucket
+        while True:
+            reference = first + hand * SLOT.size + REFERENCE_OFFSET
+            victim = hand
+            hand = (hand + 1) % self.slotsPerBucket
+            if data[reference]:
+                data[reference] = 0
+            else:
+                BUCKET_HEADER.pack_into(data, bucket, hand)
+                return victim
+
+    def Usage(self):
+        # Number of slots in use (reads the whole file)
+        used = 0
+        for bucket in range(self.buckets):
+            offset = HEADER.size + bucket * self.bucketSize + BUCKET_HEADER.size
+            for _ in range(self.slotsPerBucket):
+                used += struct.unpack_from('<Q', self.data, offset)[0] != 0
+                offset += SLOT.size
+        return used
+
+
+# Caches opened in this process, by path
+_openCaches = {}
+
+
+def OpenPositionCache(path, buckets=1 << 16, slotsPerBucket=8):
+    # Open a cache file once per process and share it between players
+    cache = _openCaches.get(path)
+    if cache is None:
+        cache = _openCaches[path] = PositionCache(path, buckets, slotsPerBucket)
+    return cache
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('path')
+    parser.add_argument('--buckets', type=int, default=1 << 16,
+                        help='buckets of a new file')
+    parser.add_argument('--slots-per-bucket', type=int, default=8,
+                        help='slots per bucket of a new file')
+    parser.add_argument('--stats', action='store_true',
+                        help='print the size and the number of slots in use')
+    args = parser.parse_args()
+    cache = PositionCache(args.path, args.buckets, args.slots_per_bucket)
+    try:
+        if args.stats:
+            print("{0}: {1} of {2} slots in use ({3} buckets of {4})".format(
+                args.path, cache.Usage(), len(cache), cache.buckets, cache.slotsPerBucket))
+    finally:
+        cache.Close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Instrumentation and profiling of the search.
+
+InstrumentedGameTreePlayer is a GameTreePlayer whose MakeMove, UnmakeMove,
+IsGameFinished, EvaluateBoard and move ordering are wrapped with counters
+and timers, and which counts nodes and cutoffs per ply. The wrappers live
+only in the subclass, so a plain GameTreePlayer runs exactly the code it
+ran before and pays nothing for them. The timers themselves cost time, so
+the phase times of an instrumented search add up to more than a plain
+search takes; compare them with each other, not with a plain search.
+
+ProfileSearch runs one search under cProfile (writing a pstats file, e.g.
+for snakeviz or flameprof) or under a sampling profiler (writing folded
+stacks, one "frame;frame;... count" line per stack, for flamegraph.pl or
+speedscope).
+
+Usage: python3 Profiling.py testcases/testcase.csv --depth 7 --profiler sample --output search.folded
+"""
+from collections import Counter
+import argparse
+import cProfile
+import os
+import sys
+import threading
+import time
+
+from main import GameTreePlayer, LoadTestcaseStateFromCSVfile
+from MoveOrdering import MoveOrdering
+
+PHASES = ('ordering', 'makeMove', 'unmakeMove', 'terminalCheck', 'evaluation')
+
+
+class PhaseStats:
+    """
+    Counters and timers of one instrumented search.
+
+    calls[phase], time[phase] - calls of each phase of PHASES and the seconds spent in it.
+    nodesByPly[ply], cutoffsByPly[ply] - MinimaxAlphaBeta calls and beta
+    cutoffs at each distance from the root (ply 1 is the first move below it).
+    """
+
+    def __init__(self):
+        self.calls = dict.fromkeys(PHASES, 0)
+        self.time = dict.fromkeys(PHASES, 0.0)
+        self.nodesByPly = Counter()
+        self.cutoffsByPly = Counter()
+
+    def CutoffRate(self, ply):
+        # Fraction of the nodes at a ply that ended with a cutoff
+        nodes = self.nodesByPly[ply]
+        return self.cutoffsByPly[ply] / nodes if nodes else 0.0
+
+    def AsDict(self):
+        return {
+            'calls': dict(self.calls),
+            'time': dict(self.time),
+            'nodesByPly': {ply: self.nodesByPly[ply] for ply in sorted(self.nodesByPly)},
+            'cutoffsByPly': {ply: self.cutoffsByPly[ply] for ply in sorted(self.cutoffsByPly)},
+        }
+
+
+class InstrumentedMoveOrdering(MoveOrdering):
+    # MoveOrdering that times OrderMoves and counts cutoffs per ply
+
+    def __init__(self, phases, maxPly=42):
+        MoveOrdering.__init__(self, maxPly)
+        self.phases = phases
+
+    def OrderMoves(self, currentState, player, ply, ttMove=None, candidates=None):
+        startTime = time.perf_counter()
+        actions = MoveOrdering.OrderMoves(self, currentState, player, ply, ttMove, candidates)
+        self.phases.time['ordering'] += time.perf_counter() - startTime
+        self.phases.calls['ordering'] += 1
+        return actions
+
+    def RecordCutoff(self, currentState, player, ply, action, depth):
+        self.phases.cutoffsByPly[ply] += 1
+        MoveOrdering.RecordCutoff(self, currentState, player, ply, action, depth)
+
+
+class InstrumentedGameTreePlayer(GameTreePlayer):
+    """
+    GameTreePlayer that records a PhaseStats for every search, in phases
+    (reset by StartSearch).
+    """
+
+    def __init__(self, *args, **kwargs):
+        GameTreePlayer.__init__(self, *args, **kwargs)
+        self.phases = PhaseStats()
+        self.moveOrdering = InstrumentedMoveOrdering(self.phases)
+
+    def StartSearch(self, currentState):
+        self.phases = PhaseStats()
+        self.moveOrdering.phases = self.phases
+        return GameTreePlayer.StartSearch(self, currentState)
+
+    def MinimaxAlphaBeta(self, currentState, depth, alpha, beta, isMaximizingPlayer):
+        self.phases.nodesByPly[currentState.moveCount - self.rootMoveCount] += 1
+        return GameTreePlayer.MinimaxAlphaBeta(self, currentState, depth, alpha, beta, isMaximizingPlayer)
+
+    def MakeMove(self, currentState, action, player):
+        startTime = time.perf_counter()
+        GameTreePlayer.MakeMove(self, currentState, action, player)
+        self.phases.time['makeMove'] += time.perf_counter() - startTime
+        self.phases.calls['makeMove'] += 1
+
+    def UnmakeMove(self, currentState):
+        startTime = time.perf_counter()
+        GameTreePlayer.UnmakeMove(self, currentState)
+        self.phases.time['unmakeMove'] += time.perf_counter() - startTime
+        self.phases.calls['unmakeMove'] += 1
+
+    def IsGameFinished(self, currentState):
+        startTime = time.perf_counter()
+        finished = GameTreePlayer.IsGameFinished(self, currentState)
+        self.phases.time['terminalCheck'] += time.perf_counter() - startTime
+        self.phases.calls['terminalCheck'] += 1
+        return finished
+
+    def EvaluateBoard(self, currentState):
+        startTime = time.perf_counter()
+        score = GameTreePlayer.EvaluateBoard(self, currentState)
+        self.phases.time['evaluation'] += time.perf_counter() - startTime
+        self.phases.calls['evaluation'] += 1
+        return score
+
+
+def _FrameName(frame):
+    code = frame.f_code
+    return "{0}:{1}".format(os.path.basename(code.co_filename), code.co_name)
+
+
+def SampleStacks(function, *args, interval=0.001):
+    """
+    Call function(*args) while a background thread records the stack of the
+    calling thread every interval seconds.
+
+    Returns:
+    result, stacks (Counter): The function's return value, and the number of
+    samples of every stack as a "outermost;...;innermost" string.
+    """
+    stacks = Counter()
+    threadId = threading.get_ident()
+    done = threading.Event()
+
+    def Sample():
+        while not done.wait(interval):
+            frame = sys._current_frames().get(threadId)
+            names = []
+            while frame is not None:
+                names.append(_FrameName(frame))
+                frame = frame.f_back
+            stacks[';'.join(reversed(names))] += 1
+
+    # The sampler needs the interpreter lock to look at the other thread
+    switchInterval = sys.getswitchinterval()
+    sys.setswitchinterval(min(switchInterval, interval))
+    sampler = threading.Thread(target=Sample, daemon=True)
+    sampler.start()
+    try:
+        result = function(*args)
+    finally:
+        done.set()
+        sampler.join()
+        sys.setswitchinterval(switchInterval)
+    return result, stacks
+
+
+def WriteFoldedStacks(stacks, path):
+    with open(path, 'w') as f:
+        for stack, count in sorted(stacks.items()):
+            f.write("{0} {1}\n".format(stack, count))
+
+
+def ProfileSearch(player, currentState, path, profiler='sample', interval=0.001):
+    """
+    Run player.Search on currentState under a profiler and write its output to path.
+
+    Parameters:
+    profiler (str): 'sample' writes folded stacks, 'cprofile' a pstats file.
+    interval (float): Seconds between samples of the sampling profiler.
+
+    Returns:
+    stats (SearchStats): The statistics of the search.
+    """
+    if profiler == 'cprofile':
+        profile = cProfile.Profile()
+        stats = profile.runcall(player.Search, currentState)
+        profile.dump_stats(path)
+    elif profiler == 'sample':
+        stats, stacks = SampleStacks(player.Search, currentState, interval=interval)
+        WriteFoldedStacks(stacks, path)
+    else:
+        raise ValueError("Unknown profiler {0!r}".format(profiler))
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('testcase', nargs='?', default='testcases/testcase.csv',
+                        help='CSV board file (player 2 to move)')
+    parser.add_argument('--depth', type=int, default=7)
+    parser.add_argument('--profiler', choices=('sample', 'cprofile', 'none'), default='none',
+                        help='profile the search instead of instrumenting it')
+    parser.add_argument('--interval', type=float, default=0.001,
+                        help='seconds between samples of the sampling profiler')
+    parser.add_argument('--output', default='search.folded',
+                        help='folded stacks (sample) or pstats (cprofile) file')
+    args = parser.parse_args()
+
+    currentState = LoadTestcaseStateFromCSVfile(args.testcase)
+    if args.profiler != 'none':
+        stats = ProfileSearch(GameTreePlayer(args.depth, solverThreshold=0), currentState,
+                              args.output, args.profiler, args.interval)
+        print("Best action {0}, {1} nodes in {2:.3f}s, profile written to {3}".format(
+            stats.bestAction, stats.nodes, stats.time, args.output))
+        return
+
+    player = InstrumentedGameTreePlayer(args.depth, solverThreshold=0)
+    stats = player.Search(currentState)
+    phases = player.phases
+    print("Best action {0}, {1} nodes in {2:.3f}s".format(stats.bestAction, stats.nodes, stats.time))
+    print("{0:<14}{1:>10}{2:>12}{3:>12}".format('phase', 'calls', 'seconds', 'us/call'))
+    for phase in PHASES:
+        calls = phases.calls[phase]
+        seconds = phases.time[phase]
+        print("{0:<14}{1:>10}{2:>12.4f}{3:>12.2f}".format(
+            phase, calls, seconds, 1e6 * seconds / calls if calls else 0.0))
+    print("{0:<6}{1:>10}{2:>10}{3:>10}".format('ply', 'nodes', 'cutoffs', 'rate'))
+    for ply in sorted(phases.nodesByPly):
+        print("{0:<6}{1:>10}{2:>10}{3:>10.3f}".format(
+            ply, phases.nodesByPly[ply], phases.cutoffsByPly[ply], phases.CutoffRate(ply)))
+
+
+if __name__ == '__main__':
+    main()
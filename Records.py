@@ -0,0 +1,219 @@
+"""
+Compact binary files of positions and of game records.
+
+Both kinds of file are a 16-byte header followed by fixed-width records, so
+record i sits at a known offset and a whole file can be viewed as a NumPy
+array over a memory map without parsing or copying.
+
+    header   16 bytes: magic (4), version (u16), record size (u16), record count (u64)
+
+Position files (magic b'FCPS') hold one 8-byte record per position: its
+Bitboard.Key (u64), which gives every coin of the board.
+
+Game files (magic b'FCGM') hold one 64-byte record per game:
+    seed (u32), cutOffDepth (u8), winner (u8, 0 for a draw), moves (u8),
+    1 byte padding, recursive minimax calls (u64), duration in seconds (f32),
+    the column of every move in order (42 x u8, 0 after the last move),
+    2 bytes padding
+
+All values are little endian. NumPy is needed only for the array views.
+"""
+import mmap
+import struct
+
+from Bitboard import Bitboard, WIDTH, COLUMN_BITS
+
+VERSION = 1
+HEADER = struct.Struct('<4sHHQ')
+POSITION_MAGIC = b'FCPS'
+POSITION_RECORD = struct.Struct('<Q')
+GAME_MAGIC = b'FCGM'
+GAME_RECORD = struct.Struct('<IBBBxQf42s2x')
+
+
+class RecordWriter:
+    """
+    Writes records to a new file one at a time. The record count in the
+    header is filled in by Close.
+    """
+
+    def __init__(self, path, magic, record):
+        self.file = open(path, 'wb')
+        self.magic = magic
+        self.record = record
+        self.count = 0
+        self.file.write(HEADER.pack(magic, VERSION, record.size, 0))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.Close()
+
+    def Write(self, *values):
+        self.file.write(self.record.pack(*values))
+        self.count += 1
+
+    def Close(self):
+        if self.file.closed:
+            return
+        self.file.seek(0)
+        self.file.write(HEADER.pack(self.magic, VERSION, self.record.size, self.count))
+        self.file.close()
+
+
+def _OpenRecords(path, magic, record):
+    # Memory map of a record file and its record count, after checking the header
+    with open(path, 'rb') as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    fileMagic, version, recordSize, count = HEADER.unpack_from(data, 0)
+    if fileMagic != magic or version != VERSION or recordSize != record.size:
+        data.close()
+        raise ValueError("{0} is not a record file of this kind and version".format(path))
+    if len(data) < HEADER.size + count * record.size:
+        data.close()
+        raise ValueError("{0} is truncated".format(path))
+    return data, count
+
+
+def _ReadRecords(path, magic, record):
+    data, count = _OpenRecords(path, magic, record)
+    try:
+        for offset in range(HEADER.size, HEADER.size + count * record.size, record.size):
+            yield record.unpack_from(data, offset)
+    finally:
+        data.close()
+
+
+def _View(path, magic, record, dtype):
+    import numpy as np
+    data, count = _OpenRecords(path, magic, record)
+    data.close()
+    return np.memmap(path, dtype=dtype, mode='r', offset=HEADER.size, shape=(count,))
+
+
+def IsRecordFile(path, magic=POSITION_MAGIC):
+    with open(path, 'rb') as f:
+        return f.read(len(magic)) == magic
+
+
+def WritePositions(path, states):
+    """
+    Write GetCurrentState() grids (or Bitboards) to a position file.
+
+    Returns:
+    count (int): The number of positions written.
+    """
+    with RecordWriter(path, POSITION_MAGIC, POSITION_RECORD) as writer:
+        for state in states:
+            board = state if isinstance(state, Bitboard) else Bitboard.FromState(state)
+            writer.Write(board.Key())
+    return writer.count
+
+
+def ReadPositionKeys(path):
+    # Yield the Bitboard.Key of every position of a position file
+    for (key,) in _ReadRecords(path, POSITION_MAGIC, POSITION_RECORD):
+        yield key
+
+
+def ReadPositions(path):
+    # Yield every position of a position file as a GetCurrentState() grid
+    for key in ReadPositionKeys(path):
+        yield Bitboard.FromKey(key).ToState()
+
+
+def ReadPosition(path, index):
+    # The position at an index of a position file, as a GetCurrentState() grid
+    data, count = _OpenRecords(path, POSITION_MAGIC, POSITION_RECORD)
+    try:
+        if not 0 <= index < count:
+            raise IndexError("{0} holds {1} positions".format(path, count))
+        key = POSITION_RECORD.unpack_from(data, HEADER.size + index * POSITION_RECORD.size)[0]
+    finally:
+        data.close()
+    return Bitboard.FromKey(key).ToState()
+
+
+def PositionKeysView(path):
+    """
+    Returns:
+    keys (read-only uint64 NumPy memmap): The keys of a position file.
+    """
+    return _View(path, POSITION_MAGIC, POSITION_RECORD, '<u8')
+
+
+# Cells taken in a column, by the COLUMN_BITS bits of the column in a key
+_COLUMN_FILLED = [(1 << (bits.bit_length() - 1)) - 1 if bits else 0 for bits in range(1 << COLUMN_BITS)]
+
+
+def KeysToBitboards(keys):
+    """
+    Returns:
+    bitboards (uint64 NumPy array of shape (N, 2)): The player 1 and player 2
+    bitboards of an array of position keys, e.g. a PositionKeysView.
+    BatchEvaluation.BitboardsToArray turns them into grids.
+    """
+    import numpy as np
+    shifts = np.arange(WIDTH, dtype=np.uint64) * np.uint64(COLUMN_BITS)
+    columns = (np.asarray(keys, dtype=np.uint64)[:, None] >> shifts) & np.uint64(0x7f)
+    # The coins of a column are the bits below its highest set bit
+    filled = np.array(_COLUMN_FILLED, dtype=np.uint64)[columns.astype(np.intp)]
+    player1 = np.bitwise_or.reduce((columns & filled) << shifts, axis=1)
+    mask = np.bitwise_or.reduce(filled << shifts, axis=1)
+    return np.stack([player1, mask ^ player1], axis=1)
+
+
+def WriteGames(path, records):
+    """
+    Write game records, as Tournament.PlayTournamentGame returns them, to a
+    game file.
+
+    Returns:
+    count (int): The number of games written.
+    """
+    with RecordWriter(path, GAME_MAGIC, GAME_RECORD) as writer:
+        for record in records:
+            WriteGameRecord(writer, record)
+    return writer.count
+
+
+def WriteGameRecord(writer, record):
+    # Append one game record to an open game file RecordWriter
+    writer.Write(record['seed'], record['cutOffDepth'], record['winner'] or 0,
+                 record['moves'], record['recursiveMinimaxCalls'],
+                 record['duration'], bytes(record['moveList']))
+
+
+def ReadGames(path):
+    # Yield the records of a game file in the form WriteGames takes
+    for seed, cutOffDepth, winner, moves, calls, duration, moveList in \
+            _ReadRecords(path, GAME_MAGIC, GAME_RECORD):
+        yield {
+            'type': 'game',
+            'cutOffDepth': cutOffDepth,
+            'seed': seed,
+            'winner': winner or None,
+            'moves': moves,
+            'moveList': list(moveList[:moves]),
+            'recursiveMinimaxCalls': calls,
+            'duration': duration,
+        }
+
+
+def GamesView(path):
+    """
+    Returns:
+    games (read-only NumPy memmap of a structured dtype): The records of a
+    game file, with fields seed, cutOffDepth, winner, moves,
+    recursiveMinimaxCalls, duration and moveList (42 columns per game).
+    """
+    import numpy as np
+    dtype = np.dtype({
+        'names': ['seed', 'cutOffDepth', 'winner', 'moves', 'recursiveMinimaxCalls',
+                  'duration', 'moveList'],
+        'formats': ['<u4', 'u1', 'u1', 'u1', '<u8', '<f4', ('u1', 42)],
+        'offsets': [0, 4, 5, 6, 8, 16, 20],
+        'itemsize': GAME_RECORD.size,
+    })
+    return _View(path, GAME_MAGIC, GAME_RECORD, dtype)
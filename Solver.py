@@ -0,0 +1,286 @@
+#!/usr/bin/env python3
+"""
+Perfect-play solver for positions near the end of the game.
+
+The solver runs a negamax search on a (current player's coins, all coins)
+bitboard pair. It uses:
+- score-bound pruning: the window is clipped to the best and worst score
+  still reachable with the coins left,
+- a transposition table holding upper bounds,
+- only moves that do not hand the opponent an immediate win,
+- moves ordered by the number of winning cells they create.
+Solve narrows the score with a sequence of null-window searches (a binary
+search over the score range, as MTD(f) does around a guess).
+
+Scores are from the view of the player to move. A win with the player's
+coin completing four as the m-th coin on the board scores (44 - m) // 2,
+so faster wins score higher. A loss scores the negative of the opponent's
+win, and a draw scores 0. DistanceToMate turns a score back into plies.
+
+Usage: python3 Solver.py --benchmark
+"""
+import argparse
+import json
+import random
+import time
+
+from Bitboard import Bitboard, BOTTOM_MASK, BOARD_MASK, ColumnMask, WinningCells, WIDTH, HEIGHT
+
+CELLS = WIDTH * HEIGHT
+COLUMN_ORDER = (3, 2, 4, 1, 5, 0, 6)
+COLUMN_MASKS = tuple(ColumnMask(col) for col in range(WIDTH))
+
+
+def _Div2(n):
+    # Division by two rounding toward zero
+    return n // 2 if n >= 0 else -((-n) // 2)
+
+
+def DistanceToMate(score, moveCount):
+    """
+    Plies until the game ends with a win, counted from a position with
+    moveCount coins (including the winning move), or None for a draw.
+    """
+    if score == 0:
+        return None
+    # The winning coin is the m-th coin on the board, m of the winner's parity
+    if score > 0:
+        m = 44 - 2 * score
+        if m % 2 != (moveCount + 1) % 2:
+            m -= 1
+    else:
+        m = 44 + 2 * score
+        if m % 2 != moveCount % 2:
+            m -= 1
+    return m - moveCount
+
+
+class Solver:
+    """
+    Exact solver with its own transposition table (kept between calls).
+    """
+
+    def __init__(self, tableSize=1048583):
+        # tableSize is best a prime, so the keys spread over the slots
+        self.tableSize = tableSize
+        self.keys = [0] * tableSize
+        self.values = [0] * tableSize
+        self.nodes = 0
+
+    def Reset(self):
+        self.keys = [0] * self.tableSize
+        self.values = [0] * self.tableSize
+
+    def _NonLosingMoves(self, current, mask):
+        # Playable cells that do not let the opponent win on the next move
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        opponentWin = WinningCells(current ^ mask, mask)
+        forced = possible & opponentWin
+        if forced:
+            if forced & (forced - 1):
+                return 0  # two threats to block: lost
+            possible = forced
+        # Never play right under an opponent's winning cell
+        return possible & ~(opponentWin >> 1)
+
+    def Negamax(self, current, mask, moves, alpha, beta):
+        """
+        Score of the position for the player to move, assuming that player
+        cannot win with the next coin. Returns a value v with:
+        v <= alpha if the true score is <= alpha (v is an upper bound),
+        v >= beta if the true score is >= beta (v is a lower bound),
+        the exact score otherwise.
+        """
+        self.nodes += 1
+        nextMoves = self._NonLosingMoves(current, mask)
+        if nextMoves == 0:
+            return -_Div2(CELLS - moves)
+        if moves >= CELLS - 2:
+            return 0
+
+        low = -_Div2(CELLS - 2 - moves)
+        if alpha < low:
+            alpha = low
+            if alpha >= beta:
+                return alpha
+        high = _Div2(CELLS - 1 - moves)
+        key = current + mask
+        slot = key % self.tableSize
+        if self.keys[slot] == key:
+            high = self.values[slot]
+        if beta > high:
+            beta = high
+            if alpha >= beta:
+                return beta
+
+        # Moves creating the most winning cells first, center columns on ties
+        candidates = []
+        for col in COLUMN_ORDER:
+            move = nextMoves & COLUMN_MASKS[col]
+            if move:
+                threats = WinningCells(current | move, mask).bit_count()
+                candidates.append((-threats, len(candidates), move))
+        candidates.sort()
+
+        for _, _, move in candidates:
+            score = -self.Negamax(current ^ mask, mask | move, moves + 1, -beta, -alpha)
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        # Every move failed low or was searched exactly: alpha is an upper bound
+        self.keys[slot] = key
+        self.values[slot] = alpha
+        return alpha
+
+    def Solve(self, current, mask, moves):
+        # Exact score of the position by null-window searches
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        if WinningCells(current, mask) & possible:
+            return _Div2(CELLS + 1 - moves)
+        low = -_Div2(CELLS - moves)
+        high = _Div2(CELLS + 1 - moves)
+        while low < high:
+            med = low + _Div2(high - low)
+            if med <= 0 and _Div2(low) < med:
+                med = _Div2(low)
+            elif med >= 0 and _Div2(high) > med:
+                med = _Div2(high)
+            r = self.Negamax(current, mask, moves, med, med + 1)
+            if r <= med:
+                high = r
+            else:
+                low = r
+        return low
+
+    def BestMove(self, board, player):
+        """
+        Solve a Bitboard for the given player to move.
+
+        Returns:
+        bestAction (int), score (int): The first column (in center-first order)
+        with the best exact score, and that score.
+        """
+        current = board.bitboards[player - 1]
+        mask = board.Mask()
+        moves = board.moveCount
+        bestAction = None
+        bestScore = None
+        for col in COLUMN_ORDER:
+            if not board.CanPlay(col):
+                continue
+            if board.IsWinningMove(col, player):
+                return col, _Div2(CELLS + 1 - moves)
+            move = (mask + BOTTOM_MASK) & COLUMN_MASKS[col]
+            score = -self.Solve(current ^ mask, mask | move, moves + 1)
+            if bestScore is None or score > bestScore:
+                bestAction = col
+                bestScore = score
+        return bestAction, bestScore
+
+
+def RandomPosition(rng, moveCount):
+    # A position reached by random play, with no four in a row and no
+    # immediate win for the player to move; None if play could not get there
+    board = Bitboard()
+    player = 1
+    while board.moveCount < moveCount:
+        cols = [col for col in range(WIDTH)
+                if board.CanPlay(col) and not board.IsWinningMove(col, player)]
+        if not cols:
+            return None
+        board.Push(rng.choice(cols), player)
+        player = 3 - player
+    if any(board.CanPlay(col) and board.IsWinningMove(col, player) for col in range(WIDTH)):
+        return None
+    return board, player
+
+
+def BenchmarkSuite(count=20, seed=0, stages=((28, 'endgame'), (24, 'late middlegame'), (20, 'middlegame'))):
+    """
+    A fixed set of positions for each stage, given as (coins on the board, name).
+
+    Returns:
+    suite (list of (name, [(Bitboard, player to move)])).
+    """
+    rng = random.Random(seed)
+    suite = []
+    for moveCount, name in stages:
+        positions = []
+        while len(positions) < count:
+            position = RandomPosition(rng, moveCount)
+            if position is not None:
+                positions.append(position)
+        suite.append((name, positions))
+    return suite
+
+
+def RunBenchmark(suite):
+    """
+    Solve every position of the suite with a fresh solver per stage.
+
+    Returns:
+    results (list of dict): Per stage, positions, mean and max seconds, mean
+    nodes, nodes per second, and the number of wins, losses and draws.
+    """
+    results = []
+    for name, positions in suite:
+        solver = Solver()
+        times = []
+        outcomes = [0, 0, 0]
+        nodes = 0
+        for board, player in positions:
+            solver.nodes = 0
+            startTime = time.perf_counter()
+            _, score = solver.BestMove(board, player)
+            times.append(time.perf_counter() - startTime)
+            nodes += solver.nodes
+            outcomes[0 if score > 0 else 1 if score < 0 else 2] += 1
+        total = sum(times)
+        results.append({
+            'stage': name,
+            'emptyCells': CELLS - positions[0][0].moveCount,
+            'positions': len(positions),
+            'meanTime': total / len(positions),
+            'maxTime': max(times),
+            'meanNodes': nodes / len(positions),
+            'nodesPerSecond': nodes / total if total > 0 else 0.0,
+            'wins': outcomes[0],
+            'losses': outcomes[1],
+            'draws': outcomes[2],
+        })
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--benchmark', action='store_true',
+                        help='solve the standard suite and print one JSON line per stage')
+    parser.add_argument('--positions', type=int, default=20,
+                        help='positions per stage')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', type=int, nargs='+', default=[28, 24, 20],
+                        help='coins on the board for each stage')
+    parser.add_argument('testcases', nargs='*',
+                        help='CSV board files to solve with player 2 to move')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        stages = [(moveCount, '{0} coins'.format(moveCount)) for moveCount in args.stages]
+        for result in RunBenchmark(BenchmarkSuite(args.positions, args.seed, stages)):
+            print(json.dumps(result))
+    from main import LoadTestcaseStateFromCSVfile
+    for path in args.testcases:
+        board = Bitboard.FromState(LoadTestcaseStateFromCSVfile(path))
+        solver = Solver()
+        startTime = time.perf_counter()
+        action, score = solver.BestMove(board, 2)
+        print(json.dumps({
+            'testcase': path, 'bestAction': action, 'score': score,
+            'distanceToMate': DistanceToMate(score, board.moveCount),
+            'nodes': solver.nodes, 'time': time.perf_counter() - startTime,
+        }))
+
+
+if __name__ == '__main__':
+    main()
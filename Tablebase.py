@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Endgame tablebase: exact results for late positions, precomputed offline and
+looked up by binary search over a memory-mapped file.
+
+The file is a position table as in OpeningBook.py, with magic b'FCTB'. The
+max ply field of the header holds the largest number of empty cells of the
+positions in the table. Every record holds the exact score (see Solver.py)
+for the player to move, which is player 1 when the coin count is even and
+player 2 when it is odd, and the first best move in center-first order.
+Positions are keyed by Bitboard.CanonicalKey, so a position and its mirror
+image share one record.
+
+All positions with K empty cells are far too many to enumerate for any
+useful K. The generator plays games of GameTreePlayer against the Myopic
+player and takes the first position of each game with at most K empty
+cells. Most of these games are decided early, so it adds the positions of
+games played at random as well. It then solves the complete game tree below
+every seed position by exhaustive search. Every position met on the way goes
+into the table, so the table covers the late positions games reach.
+
+Usage: python3 Tablebase.py --empty 12 --games 200 --random 1000 --output tablebase.bin
+"""
+from concurrent.futures import ProcessPoolExecutor
+import argparse
+import random
+import time
+
+from Bitboard import Bitboard, BOTTOM_MASK, BOARD_MASK, WinningCells, MirrorBits, MirrorMove
+from OpeningBook import PositionTable, WritePositionTable, LoadPositionTable
+from Solver import CELLS, COLUMN_ORDER, COLUMN_MASKS, RandomPosition
+
+MAGIC = b'FCTB'
+
+
+class Tablebase(PositionTable):
+    """
+    Read-only view of a tablebase file.
+    """
+
+    def __init__(self, path):
+        PositionTable.__init__(self, path, MAGIC)
+        self.maxEmpty = self.maxPly
+
+
+def LoadTablebase(path):
+    return LoadPositionTable(path, Tablebase)
+
+
+def SeedPositions(games, maxEmpty, seed=0, cutOffDepth=3, randomGames=0):
+    """
+    Play games of GameTreePlayer against the Myopic player, as PlayGame does,
+    and keep the first position of each game with at most maxEmpty empty cells.
+    Add the positions with maxEmpty empty cells of randomGames games of random
+    (but not immediately losing) moves.
+
+    Returns:
+    states (list of lists of lists): GetCurrentState() grids with no winner.
+    """
+    from FourConnect import FourConnect, SILENT
+    from main import GameTreePlayer
+    gameTree = GameTreePlayer(cutOffDepth, solverThreshold=0)
+    states = []
+    for game in range(games):
+        random.seed(seed + game)
+        fourConnect = FourConnect(SILENT)
+        move = 0
+        while move < 42 and fourConnect.winner is None:
+            if 42 - move <= maxEmpty:
+                states.append(fourConnect.GetCurrentState())
+                break
+            if move % 2 == 0:
+                fourConnect.MyopicPlayerAction()
+            else:
+                fourConnect.GameTreePlayerAction(
+                    gameTree.FindBestAction(fourConnect.GetCurrentState()))
+            move += 1
+    rng = random.Random(seed)
+    while randomGames > 0:
+        position = RandomPosition(rng, CELLS - maxEmpty)
+        if position is not None:
+            states.append(position[0].ToState())
+            randomGames -= 1
+    return states
+
+
+def SolveSubtree(state):
+    """
+    Solve every position below a state by exhaustive negamax, each position
+    (or its mirror image) once. Player 1 is to move when the coin count is even.
+
+    Returns:
+    records (list of (key, bestMove, score)): One per position with no winner
+    and at least one empty cell, keyed by Bitboard.CanonicalKey.
+    """
+    board = Bitboard.FromState(state)
+    memo = {}
+    records = []
+
+    def Visit(current, mask, moves):
+        # Returns the score of the position for the player to move. The
+        # columns of current + mask never carry into each other, so the
+        # mirror of the sum is the sum of the mirrors.
+        key = current + mask
+        mirrorKey = MirrorBits(key)
+        score = memo.get(min(key, mirrorKey))
+        if score is not None:
+            return score
+        possible = (mask + BOTTOM_MASK) & BOARD_MASK
+        wins = WinningCells(current, mask) & possible
+        bestMove = None
+        bestScore = None
+        for col in COLUMN_ORDER:
+            move = possible & COLUMN_MASKS[col]
+            if not move:
+                continue
+            if wins & move:
+                score = (CELLS + 1 - moves) // 2
+            elif moves + 1 == CELLS:
+                score = 0
+            else:
+                score = -Visit(current ^ mask, mask | move, moves + 1)
+            if bestScore is None or score > bestScore:
+                bestMove = col
+                bestScore = score
+                if wins & move:
+                    break
+        memo[min(key, mirrorKey)] = bestScore
+        player1 = current if moves % 2 == 0 else current ^ mask
+        tableKey = (mask + BOTTOM_MASK) | player1
+        mirrorTableKey = MirrorBits(tableKey)
+        if mirrorTableKey < tableKey:
+            records.append((mirrorTableKey, MirrorMove(bestMove), bestScore))
+        else:
+            records.append((tableKey, bestMove, bestScore))
+        return bestScore
+
+    moves = board.moveCount
+    Visit(board.bitboards[moves % 2], board.Mask(), moves)
+    return records
+
+
+def BuildTablebase(path, maxEmpty=12, games=200, randomGames=1000, seed=0, cutOffDepth=3,
+                   workers=None):
+    """
+    Solve the subtrees below the seed positions of the given games and write
+    the tablebase.
+
+    Returns:
+    count (int): The number of positions written.
+    """
+    states = SeedPositions(games, maxEmpty, seed, cutOffDepth, randomGames)
+    records = {}
+    with ProcessPoolExecutor(workers) as executor:
+        for subtree in executor.map(SolveSubtree, states, chunksize=16):
+            for record in subtree:
+                records[record[0]] = record
+    WritePositionTable(path, records.values(), maxEmpty, 0, MAGIC)
+    return len(records)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--empty', type=int, default=12,
+                        help='positions have at most this many empty cells')
+    parser.add_argument('--games', type=int, default=200,
+                        help='games against the Myopic player played for seed positions')
+    parser.add_argument('--random', type=int, default=1000,
+                        help='random games played for seed positions')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--depth', type=int, default=3,
+                        help='cutoff depth of the player in the seed games')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--output', default='tablebase.bin')
+    args = parser.parse_args()
+    startTime = time.time()
+    count = BuildTablebase(args.output, args.empty, args.games, args.random, args.seed,
+                           args.depth, args.workers)
+    print("Wrote {0} positions to {1} in {2:.1f}s".format(
+        count, args.output, time.time() - startTime))
+
+
+if __name__ == '__main__':
+    main()
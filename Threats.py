@@ -0,0 +1,81 @@
+"""
+Static threat analysis on bitboards, used by GameTreePlayer to prune and to
+score the horizon.
+
+A threat of a player is an empty cell that would complete four of the
+player's coins (Bitboard.WinningCells). For the player to move:
+- a threat of its own that is playable now wins at once,
+- two playable threats of the opponent cannot both be blocked, so it loses,
+- one playable threat of the opponent must be blocked, leaving one move,
+- a move right below a threat of the opponent lets the opponent win on top.
+
+None of this needs a move to be made. At the horizon the threats further up
+the board are scored by zugzwang parity: as the board fills up, player 1
+(who moves first) can force the play of a threat on an odd row (1, 3, 5
+counted from the bottom), and player 2 one on an even row.
+"""
+from Bitboard import BOTTOM_MASK, BOARD_MASK, WinningCells
+
+# Cells of the odd rows (1, 3, 5 from the bottom) and of the even rows
+ODD_ROWS = BOTTOM_MASK * 0b010101
+EVEN_ROWS = BOTTOM_MASK * 0b101010
+
+# Outcomes of ForcedMoves, for the player to move
+WIN = 1
+LOSS = -1
+
+# Score of a threat on the row of the right parity for its player
+PARITY_WEIGHT = 500
+
+
+def ForcedMoves(board, player):
+    """
+    Moves worth searching for the player to move on a Bitboard.
+
+    Returns:
+    outcome (int or None), moves (int): WIN or LOSS if the position is decided
+    without search, and otherwise the mask of the cells worth playing: the
+    one forced block if there is one, else every playable cell that is not
+    right below a threat of the opponent.
+    """
+    mask = board.Mask()
+    playable = (mask + BOTTOM_MASK) & BOARD_MASK
+    if WinningCells(board.bitboards[player - 1], mask) & playable:
+        return WIN, 0
+    threats = WinningCells(board.bitboards[2 - player], mask)
+    forced = threats & playable
+    if forced:
+        if forced & (forced - 1) or forced & (threats >> 1):
+            # Two threats to block, or one right below another
+            return LOSS, 0
+        return None, forced
+    moves = playable & ~(threats >> 1)
+    if not moves:
+        return LOSS, 0
+    return None, moves
+
+
+def HorizonScore(board, player):
+    """
+    Static threat score of a Bitboard with the player to move.
+
+    Returns:
+    outcome (int or None), score (int): WIN or LOSS if the player to move
+    wins at once or cannot stop the opponent's playable threats. Otherwise
+    the parity score, from player 2's view: the threats of player 2 on even
+    rows minus those of player 1 on odd rows, times PARITY_WEIGHT. Threats
+    that are playable now count no parity.
+    """
+    mask = board.Mask()
+    playable = (mask + BOTTOM_MASK) & BOARD_MASK
+    threats1 = WinningCells(board.bitboards[0], mask)
+    threats2 = WinningCells(board.bitboards[1], mask)
+    own, theirs = (threats1, threats2) if player == 1 else (threats2, threats1)
+    if own & playable:
+        return WIN, 0
+    forced = theirs & playable
+    if forced & (forced - 1):
+        return LOSS, 0
+    waiting = ~playable
+    score = (threats2 & waiting & EVEN_ROWS).bit_count() - (threats1 & waiting & ODD_ROWS).bit_count()
+    return None, PARITY_WEIGHT * score
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Parallel tournament runner: GameTreePlayer against the Myopic player.
+
+Games are spread over a ProcessPoolExecutor. Every game gets its own seed for
+the Myopic player's random choices, so a run can be reproduced game by game
+(without a time budget, which makes the depth depend on the clock, and
+without a position cache, which answers from earlier games' searches).
+Game i of every depth uses the seed baseSeed + i, so the depths face the same
+opponent moves wherever the games agree.
+
+Records are written as JSON lines, and with --games-file to a binary game
+file as well (see Records.py).
+
+Usage: python3 Tournament.py --depths 3 4 5 --games 100 --output results.jsonl
+"""
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+from FourConnect import FourConnect, SILENT
+from main import GameTreePlayer, PlayGame
+from Records import RecordWriter, WriteGameRecord, GAME_MAGIC, GAME_RECORD
+
+
+def PlayTournamentGame(cutOffDepth, seed, timeBudget=None, openingBook=None, positionCache=None):
+    """
+    Play one silent game and return its record.
+
+    Returns:
+    record (dict): cutOffDepth, seed, winner (1, 2 or None), moves, the columns
+    played (moveList), the recursive minimax calls of the Game Tree Player and
+    the duration of the game.
+    """
+    random.seed(seed)
+    gameTree = GameTreePlayer(cutOffDepth, timeBudget=timeBudget, openingBook=openingBook,
+                              positionCache=positionCache)
+    fourConnect = FourConnect(SILENT)
+    startTime = time.perf_counter()
+    winner, moves = PlayGame(gameTree, fourConnect=fourConnect)
+    return {
+        'type': 'game',
+        'cutOffDepth': cutOffDepth,
+        'seed': seed,
+        'winner': winner,
+        'moves': moves,
+        'moveList': fourConnect.actions,
+        'recursiveMinimaxCalls': gameTree.totalNodes,
+        'duration': time.perf_counter() - startTime,
+    }
+
+
+def RunTournament(depths=(3, 4, 5), games=100, workers=None, baseSeed=0, timeBudget=None,
+                  openingBook=None, positionCache=None):
+    """
+    Play games for every cutoff depth in parallel and yield each game record
+    as soon as it finishes (not in submission order).
+
+    At most a few games per worker are queued at a time, so memory does not
+    grow with the number of games.
+    """
+    tasks = ((depth, baseSeed + i) for depth in depths for i in range(games))
+    workers = workers or os.cpu_count() or 1
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = set()
+        for depth, seed in tasks:
+            pending.add(executor.submit(
+                PlayTournamentGame, depth, seed, timeBudget, openingBook, positionCache))
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    yield future.result()
+        for future in wait(pending).done:
+            yield future.result()
+
+
+def SummarizeResults(records):
+    """
+    Aggregate game records per cutoff depth, with the statistics PlayGameRandom
+    writes to func3_results.txt.
+
+    Returns:
+    summaries (list of dict): One record per depth, sorted by depth.
+    """
+    byDepth = {}
+    for record in records:
+        byDepth.setdefault(record['cutOffDepth'], []).append(record)
+
+    summaries = []
+    for depth in sorted(byDepth):
+        games = byDepth[depth]
+        wins = [g['moves'] for g in games if g['winner'] == 2]
+        loss = [g['moves'] for g in games if g['winner'] == 1]
+        draws = [g['moves'] for g in games if g['winner'] is None]
+        summaries.append({
+            'type': 'summary',
+            'cutOffDepth': depth,
+            'games': len(games),
+            'wins': len(wins),
+            'loss': len(loss),
+            'draws': len(draws),
+            'avgMovesToWin': sum(wins) / len(wins) if wins else 0,
+            'avgMovesToLose': sum(loss) / len(loss) if loss else 0,
+            'avgMovesToDraw': sum(draws) / len(draws) if draws else 0,
+            'avgRecursiveMinimaxCalls': sum(g['recursiveMinimaxCalls'] for g in games) / len(games),
+            'avgDurationOfGame': sum(g['duration'] for g in games) / len(games),
+        })
+    return summaries
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--depths', type=int, nargs='+', default=[3, 4, 5])
+    parser.add_argument('--games', type=int, default=100,
+                        help='games per depth')
+    parser.add_argument('--workers', type=int, default=None,
+                        help='worker processes (default: one per CPU)')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the first game')
+    parser.add_argument('--time-budget', type=float, default=None,
+                        help='seconds per move, searching by iterative deepening')
+    parser.add_argument('--book', default=None,
+                        help='opening book file (see OpeningBook.py)')
+    parser.add_argument('--position-cache', default=None,
+                        help='position cache file shared by the workers (see PositionCache.py)')
+    parser.add_argument('--output', default=None,
+                        help='JSON lines file for the game and summary records (default: stdout)')
+    parser.add_argument('--games-file', default=None,
+                        help='binary game file for the game records (see Records.py)')
+    args = parser.parse_args()
+
+    out = open(args.output, 'w') if args.output else sys.stdout
+    gamesFile = None
+    if args.games_file:
+        gamesFile = RecordWriter(args.games_file, GAME_MAGIC, GAME_RECORD)
+    records = []
+    try:
+        for record in RunTournament(args.depths, args.games, args.workers, args.seed,
+                                    args.time_budget, args.book, args.position_cache):
+            records.append(record)
+            out.write(json.dumps(record) + '\n')
+            out.flush()
+            if gamesFile is not None:
+                WriteGameRecord(gamesFile, record)
+        for summary in SummarizeResults(records):
+            out.write(json.dumps(summary) + '\n')
+    finally:
+        if out is not sys.stdout:
+            out.close()
+        if gamesFile is not None:
+            gamesFile.Close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Bound types stored with each score
+EXACT = 0
+LOWER = 1  # the score is a lower bound (the search failed high)
+UPPER = 2  # the score is an upper bound (the search failed low)
+
+
+class TranspositionTable:
+    """
+    Fixed-size transposition table keyed by the Zobrist hash of a position.
+
+    The table is split into buckets of two slots (two-tier replacement):
+    - Slot 0 is depth-preferred. It is only replaced by a search at least as
+      deep, or when its entry is left over from an earlier search.
+    - Slot 1 is always replaced.
+    The entries live in preallocated parallel lists, so memory is fixed by
+    the size given to the constructor and never grows.
+
+    Counters:
+    hits       - probes that found the key.
+    misses     - probes that did not find the key.
+    collisions - misses where the bucket was occupied by other positions.
+    stores     - entries written.
+    """
+
+    def __init__(self, size=1 << 20):
+        # size is the number of entries, rounded down to a power of two
+        buckets = 1
+        while buckets * 4 <= size:
+            buckets *= 2
+        self.bucketMask = buckets - 1
+        self.size = buckets * 2
+        self.keys = [None] * self.size
+        self.depths = [0] * self.size
+        self.scores = [0] * self.size
+        self.flags = [EXACT] * self.size
+        self.moves = [None] * self.size
+        self.generations = [0] * self.size
+        self.generation = 0
+        self.ResetStats()
+
+    def ResetStats(self):
+        self.hits = 0
+        self.misses = 0
+        self.collisions = 0
+        self.stores = 0
+
+    def NewSearch(self):
+        # Entries from earlier searches stay usable but become replaceable
+        self.generation += 1
+
+    def Clear(self):
+        for i in range(self.size):
+            self.keys[i] = None
+            self.moves[i] = None
+        self.generation = 0
+
+    def Probe(self, key):
+        """
+        Look up a position.
+
+        Returns:
+        (depth, score, flag, bestMove) if the key is in the table, otherwise None.
+        """
+        i = (key & self.bucketMask) << 1
+        keys = self.keys
+        if keys[i] != key:
+            i += 1
+            if keys[i] != key:
+                self.misses += 1
+                if keys[i] is not None or keys[i - 1] is not None:
+                    self.collisions += 1
+                return None
+        self.hits += 1
+        return self.depths[i], self.scores[i], self.flags[i], self.moves[i]
+
+    def Store(self, key, depth, score, flag, bestMove):
+        i = (key & self.bucketMask) << 1
+        keys = self.keys
+        if keys[i] is not None and keys[i] != key and self.depths[i] > depth \
+                and self.generations[i] == self.generation:
+            # Keep the deeper entry, use the always-replace slot
+            i += 1
+        elif keys[i + 1] == key:
+            # Do not keep a stale copy of the key in the second slot
+            keys[i + 1] = None
+        keys[i] = key
+        self.depths[i] = depth
+        self.scores[i] = score
+        self.flags[i] = flag
+        self.moves[i] = bestMove
+        self.generations[i] = self.generation
+        self.stores += 1
+
+    def HitRate(self):
+        probes = self.hits + self.misses
+        return self.hits / probes if probes else 0.0
+
+    def Usage(self):
+        # Fraction of the slots holding an entry
+        return sum(key is not None for key in self.keys) / self.size
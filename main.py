@@ -1,16 +1,149 @@
 #!/usr/bin/env python3
 from FourConnect import *  # See the FourConnect.py file
+from Bitboard import Bitboard, EvaluatedBitboard, ZOBRIST_SIDE, MirrorMove
+from Evaluation import EVALUATORS, OPEN_THREE_COUNTS, GetEvaluator
+from Threats import ForcedMoves, HorizonScore, WIN
+from TranspositionTable import TranspositionTable, EXACT, LOWER, UPPER
+from MoveOrdering import MoveOrdering
+from OpeningBook import LoadOpeningBook
+from Solver import Solver, DistanceToMate
+from Tablebase import LoadTablebase
+from PositionCache import OpenPositionCache, SlotKey, Variant, SOLVED
+from Records import IsRecordFile, ReadPosition
 import csv
+import math
 import time
 
-cutOffDepth = 3
-recursiveMinimaxCalls = 0
 
+class SearchTimeout(Exception):
+    # Raised inside MinimaxAlphaBeta when the time budget of a search runs out
+    pass
 
-class GameTreePlayer:
+
+class SearchStats:
+    """
+    Statistics of one search, returned by GameTreePlayer.Search.
+
+    bestAction   - the action chosen.
+    score        - its minimax value (None if it was not searched).
+    depth        - the deepest completed search depth.
+    nodes        - number of MinimaxAlphaBeta calls.
+    time         - wall-clock seconds.
+    ttHits, ttMisses, ttCollisions - transposition table probes of this search.
+    orderingCalls, orderingTime - interior nodes ordered, and the seconds spent on it.
+    bookHit      - the action came from the opening book, nothing was searched.
+    solved       - the position was solved exactly, by the solver or from the
+                   tablebase. score is then the solver's score (see Solver.py)
+                   and distanceToMate the plies to the end of a won or lost
+                   game (None for a draw).
+    tablebaseHits - positions, the root included, answered from the tablebase.
+    threatCutoffs - interior nodes decided by immediate threats without search.
+    forcedMoves  - interior nodes where a forced block was the only move searched.
+    cacheHit     - the result came from the position cache, nothing was searched.
+    """
 
     def __init__(self):
-        pass
+        self.bestAction = None
+        self.score = None
+        self.depth = 0
+        self.nodes = 0
+        self.time = 0.0
+        self.ttHits = 0
+        self.ttMisses = 0
+        self.ttCollisions = 0
+        self.orderingCalls = 0
+        self.orderingTime = 0.0
+        self.bookHit = False
+        self.solved = False
+        self.distanceToMate = None
+        self.tablebaseHits = 0
+        self.threatCutoffs = 0
+        self.forcedMoves = 0
+        self.cacheHit = False
+
+    def NodesPerSecond(self):
+        return self.nodes / self.time if self.time > 0 else 0.0
+
+    def OrderingTimePerNode(self):
+        # Average seconds spent ordering the moves of an interior node
+        return self.orderingTime / self.orderingCalls if self.orderingCalls else 0.0
+
+    def AsDict(self):
+        return dict(self.__dict__)
+
+
+class GameTreePlayer:
+    """
+    All search settings and state belong to the instance, so players with
+    different settings can search side by side. A single instance runs one
+    search at a time; give every thread, process or task its own player.
+    """
+
+    def __init__(self, cutOffDepth=3, transpositionTableSize=1 << 18, timeBudget=None,
+                 incrementalEvaluation=True, openingBook=None, solverThreshold=14,
+                 tablebase=None, symmetry=False, evaluation='heuristic3',
+                 threatPruning=True, positionCache=None):
+        self.cutOffDepth = cutOffDepth
+        # Heuristic scoring the positions at the cutoff depth: a name
+        # registered in Evaluation.py or an Evaluation.Evaluator
+        self.evaluator = GetEvaluator(evaluation)
+        # Default time budget per move in seconds (None searches to cutOffDepth)
+        self.timeBudget = timeBudget
+        # With incremental evaluation the search runs on an EvaluatedBitboard,
+        # which updates the window counts of heuristicFunction3 on every move.
+        # Other evaluators gain nothing from it.
+        if incrementalEvaluation and self.evaluator.incremental:
+            self.boardClass = EvaluatedBitboard
+        else:
+            self.boardClass = Bitboard
+        # Opening book (a file path or an OpeningBook.PositionTable) consulted
+        # before every search
+        if isinstance(openingBook, str):
+            openingBook = LoadOpeningBook(openingBook)
+        self.openingBook = openingBook
+        # Positions with fewer empty cells than solverThreshold are solved
+        # exactly instead of searched to the cutoff depth (0 never solves)
+        self.solverThreshold = solverThreshold
+        self.solver = None
+        # Endgame tablebase (a file path or a Tablebase.Tablebase) probed at
+        # the root and at every node with few enough empty cells
+        if isinstance(tablebase, str):
+            tablebase = LoadTablebase(tablebase)
+        self.tablebase = tablebase
+        # Persistent position cache (a file path or a PositionCache.PositionCache)
+        # shared with other processes: fixed-depth searches look the position
+        # up first and store their result. Results are kept apart by the
+        # settings that change them.
+        if isinstance(positionCache, str):
+            positionCache = OpenPositionCache(positionCache)
+        self.positionCache = positionCache
+        # The transposition table lives as long as the player, so it is kept
+        # across the turns of a game. A size of 0 disables it.
+        self.transpositionTable = None
+        # With symmetry a position and its mirror image share one table entry.
+        # It is off by default: the four-cell heuristics count four windows that
+        # wrap past the top row and have no mirror image, so a shared score would
+        # be that of whichever of the two was searched first.
+        self.symmetry = symmetry
+        if transpositionTableSize:
+            self.transpositionTable = TranspositionTable(transpositionTableSize)
+        # With threat pruning only forced blocks are searched when there is
+        # one, moves right below an opponent's threat are skipped, positions
+        # decided by immediate threats are not searched at all, and the
+        # horizon adds the zugzwang parity of the threats (see Threats.py)
+        self.threatPruning = threatPruning
+        self.cacheVariant = Variant(self.evaluator.name, threatPruning, solverThreshold, symmetry)
+        # Killer moves and history scores for ordering the interior nodes
+        self.moveOrdering = MoveOrdering()
+        # Number of coins on the board at the root of the search in progress
+        self.rootMoveCount = 0
+        # Statistics of the search in progress, and of the last one finished
+        self.stats = SearchStats()
+        self.lastSearchStats = None
+        # Nodes searched over the lifetime of the player
+        self.totalNodes = 0
+        # Set while an iterative deepening search is running against the clock
+        self.deadline = None
 
     def MovePriority(self, action, currentState):
         """
@@ -18,7 +151,7 @@ class GameTreePlayer:
 
         Parameters:
         action (int): The action (column) for which to calculate the priority.
-        currentState (list of lists): The current game state.
+        currentState (Bitboard): The current game state.
 
         Returns:
         priority (int): The priority value for the given action.
@@ -38,13 +171,11 @@ class GameTreePlayer:
         priority = 0
 
         # Winning Move
-        nextBoard = self.MakeMove(currentState, action, 2)
-        if self.winner(nextBoard) == 2:
+        if currentState.IsWinningMove(action, 2):
             priority += 1000
 
         # Block Opponent's Winning Move
-        nextBoard = self.MakeMove(currentState, action, 1)
-        if self.winner(nextBoard) == 1:
+        if currentState.IsWinningMove(action, 1):
             priority += 500
 
         # Center Column
@@ -57,83 +188,180 @@ class GameTreePlayer:
 
         return priority
 
+    def OrderActions(self, currentState, isMaximizingPlayer, ttMove=None):
+        # Valid actions sorted by MovePriority (best first for player 2, reversed
+        # for player 1), with the best move of an earlier search put in front.
+        # Used for the root moves; interior nodes are ordered by self.moveOrdering.
+        validActions = self.ValidActions(currentState)
+        if self.threatPruning:
+            outcome, moves = ForcedMoves(currentState, 2 if isMaximizingPlayer else 1)
+            if moves:
+                validActions = [action for action in validActions
+                                if (moves >> currentState.heights[action]) & 1]
+        validActions.sort(key=lambda action: self.MovePriority(
+            action, currentState), reverse=isMaximizingPlayer)
+        if ttMove in validActions:
+            validActions.remove(ttMove)
+            validActions.insert(0, ttMove)
+        return validActions
+
     def MinimaxAlphaBeta(self, currentState, depth, alpha, beta, isMaximizingPlayer):
-        global recursiveMinimaxCalls
-        recursiveMinimaxCalls += 1
+        stats = self.stats
+        stats.nodes += 1
 
-        if depth == 0 or self.IsGameFinished(currentState):
+        if self.deadline is not None and stats.nodes % 1024 == 0 \
+                and time.perf_counter() >= self.deadline:
+            raise SearchTimeout()
+
+        if self.IsGameFinished(currentState):
+            return self.EvaluateBoard(currentState)
+        if depth == 0:
+            if self.threatPruning:
+                return self.EvaluateHorizon(currentState, isMaximizingPlayer)
             return self.EvaluateBoard(currentState)
 
+        tablebase = self.tablebase
+        if tablebase is not None and 42 - currentState.moveCount <= tablebase.maxEmpty \
+                and currentState.moveCount % 2 == (1 if isMaximizingPlayer else 0):
+            entry = tablebase.Find(currentState.CanonicalKey()[0])
+            if entry is not None:
+                stats.tablebaseHits += 1
+                # The score is for the player to move; only its sign is used,
+                # as a won or lost board is scored by EvaluateBoard
+                score = entry[1] if isMaximizingPlayer else -entry[1]
+                return 100000 if score > 0 else -100000 if score < 0 else 0
+
+        table = self.transpositionTable
+        ttMove = None
+        if table is not None:
+            if self.symmetry:
+                key, mirrored = currentState.CanonicalHash()
+            else:
+                key, mirrored = currentState.hash, False
+            if isMaximizingPlayer:
+                key ^= ZOBRIST_SIDE
+            entry = table.Probe(key)
+            if entry is not None:
+                entryDepth, score, flag, ttMove = entry
+                if mirrored and ttMove is not None:
+                    ttMove = MirrorMove(ttMove)
+                if entryDepth >= depth:
+                    if flag == EXACT:
+                        return score
+                    if flag == LOWER and score >= beta:
+                        return score
+                    if flag == UPPER and score <= alpha:
+                        return score
+            alphaOrig = alpha
+            betaOrig = beta
+
+        ply = currentState.moveCount - self.rootMoveCount
+        player = 2 if isMaximizingPlayer else 1
+        moves = None
+        if self.threatPruning:
+            outcome, moves = ForcedMoves(currentState, player)
+            if outcome is not None:
+                stats.threatCutoffs += 1
+                return 100000 if (outcome == WIN) == isMaximizingPlayer else -100000
+        if moves is not None and not moves & (moves - 1):
+            # A forced block, nothing to order
+            validActions = [col for col in range(7) if (moves >> currentState.heights[col]) & 1]
+            stats.forcedMoves += 1
+        else:
+            startTime = time.perf_counter()
+            validActions = self.moveOrdering.OrderMoves(currentState, player, ply, ttMove, moves)
+            stats.orderingTime += time.perf_counter() - startTime
+            stats.orderingCalls += 1
+
         if isMaximizingPlayer:
             maxEval = -float('inf')
             bestAction = None
-            validActions = self.ValidActions(currentState)
-            validActions.sort(key=lambda action: self.MovePriority(
-                action, currentState), reverse=True)
             for action in validActions:
                 # Player 2's move (Game Tree Player)
-                nextBoard = self.MakeMove(currentState, action, 2)
+                self.MakeMove(currentState, action, 2)
                 eval = self.MinimaxAlphaBeta(
-                    nextBoard, depth - 1, alpha, beta, False)
+                    currentState, depth - 1, alpha, beta, False)
+                self.UnmakeMove(currentState)
                 if eval > maxEval:
                     maxEval = eval
                     bestAction = action
                 alpha = max(alpha, eval)
                 if beta <= alpha:
+                    self.moveOrdering.RecordCutoff(currentState, 2, ply, action, depth)
                     break
-            if depth == cutOffDepth:  # If we're at the root level, return the best action
-                # check if bestAction is not None
-                return bestAction
+            if table is not None:
+                self.StoreResult(key, depth, maxEval, alphaOrig, betaOrig,
+                                 MirrorMove(bestAction) if mirrored else bestAction)
             return maxEval
         else:
             minEval = float('inf')
-            validActions = self.ValidActions(currentState)
-            validActions.sort(
-                key=lambda action: self.MovePriority(action, currentState))
+            bestAction = None
             for action in validActions:
                 # Player 1's move (Myopic Player)
-                nextBoard = self.MakeMove(currentState, action, 1)
+                self.MakeMove(currentState, action, 1)
                 eval = self.MinimaxAlphaBeta(
-                    nextBoard, depth - 1, alpha, beta, True)
-                minEval = min(minEval, eval)
+                    currentState, depth - 1, alpha, beta, True)
+                self.UnmakeMove(currentState)
+                if eval < minEval:
+                    minEval = eval
+                    bestAction = action
                 beta = min(beta, eval)
                 if beta <= alpha:
+                    self.moveOrdering.RecordCutoff(currentState, 1, ply, action, depth)
                     break
+            if table is not None:
+                self.StoreResult(key, depth, minEval, alphaOrig, betaOrig,
+                                 MirrorMove(bestAction) if mirrored else bestAction)
             return minEval
 
+    def SearchRoot(self, currentState, depth, rootActions):
+        """
+        Search the root position (player 2 to move) to the given depth.
+
+        Parameters:
+        currentState (Bitboard): The root position.
+        depth (int): Search depth in plies, including the root move.
+        rootActions (list of int): The root moves in the order to try them.
+
+        Returns:
+        bestAction (int), bestEval (int): The first action reaching the best score, and that score.
+        """
+        alpha = -float('inf')
+        bestEval = -float('inf')
+        bestAction = None
+        for action in rootActions:
+            self.MakeMove(currentState, action, 2)
+            eval = self.MinimaxAlphaBeta(
+                currentState, depth - 1, alpha, float('inf'), False)
+            self.UnmakeMove(currentState)
+            if eval > bestEval:
+                bestEval = eval
+                bestAction = action
+            alpha = max(alpha, eval)
+        return bestAction, bestEval
+
+    def StoreResult(self, key, depth, score, alphaOrig, betaOrig, bestAction):
+        # Record the score with the kind of bound the alpha-beta window allows
+        if score <= alphaOrig:
+            flag = UPPER
+        elif score >= betaOrig:
+            flag = LOWER
+        else:
+            flag = EXACT
+        self.transpositionTable.Store(key, depth, score, flag, bestAction)
+
     def ValidActions(self, currentState):
         # Returns a list of valid actions (columns to drop a coin into) for the given board state.
         validActions = []
         for action in range(7):
-            if currentState[0][action] == 0:
+            if currentState.CanPlay(action):
                 validActions.append(action)
         return validActions
 
     def winner(self, currentState):
-        # check rows
-        for row in range(6):
-            for col in range(4):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row][col + 1] == currentState[row][col + 2] == currentState[row][col + 3]:
-                    return currentState[row][col]
-
-        # check columns
-        for col in range(7):
-            for row in range(3):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row + 1][col] == currentState[row + 2][col] == currentState[row + 3][col]:
-                    return currentState[row][col]
-
-        # check diagonals
-        for row in range(3):
-            for col in range(4):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row + 1][col + 1] == currentState[row + 2][col + 2] == currentState[row + 3][col + 3]:
-                    return currentState[row][col]
-
-        for row in range(3, 6):
-            for col in range(4):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row - 1][col + 1] == currentState[row - 2][col + 2] == currentState[row - 3][col + 3]:
-                    return currentState[row][col]
-
-        return None
+        # Inside the search only the lines through the last move are checked,
+        # a freshly loaded position is checked with the full shift-and-mask test
+        return currentState.Winner()
 
     def IsGameFinished(self, currentState):
         # check if any player has won
@@ -141,243 +369,38 @@ class GameTreePlayer:
             return True
 
         # check if board is full
-        for col in range(7):
-            if currentState[0][col] == 0:
-                return False
-
-        return True
+        return currentState.IsFull()
 
     def heuristicFunction1(self, currentState):
-        # find number of 3-in-a-row for each player
-        player1 = 0
-        player2 = 0
-
-        # check rows
-        for row in range(6):
-            for col in range(5):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row][col + 1] == currentState[row][col + 2]:
-                    if currentState[row][col] == 1:
-                        player1 += 1
-                    else:
-                        player2 += 1
-
-        # check columns
-        for col in range(7):
-            for row in range(4):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row + 1][col] == currentState[row + 2][col]:
-                    if currentState[row][col] == 1:
-                        player1 += 1
-                    else:
-                        player2 += 1
-
-        # check diagonals
-        for row in range(4):
-            for col in range(5):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row + 1][col + 1] == currentState[row + 2][col + 2]:
-                    if currentState[row][col] == 1:
-                        player1 += 1
-                    else:
-                        player2 += 1
-
-        for row in range(2, 6):
-            for col in range(5):
-                if currentState[row][col] != 0 and currentState[row][col] == currentState[row - 1][col + 1] == currentState[row - 2][col + 2]:
-                    if currentState[row][col] == 1:
-                        player1 += 1
-                    else:
-                        player2 += 1
-
-        return player2 - player1
+        # Number of three-in-a-rows of player 2 minus those of player 1
+        return EVALUATORS['heuristic1'](self._AsBitboard(currentState))
 
     def findNumberOfOpportunities1(self, currentState, player):
-        opportunities = 0
-        # find the number of rows of length 4 with 3 coins of the player and 1 empty space
-        for row in range(6):
-            for col in range(4):
-                if currentState[row][col] == player and currentState[row][col + 1] == player and currentState[row][col + 2] == player and currentState[row][col + 3] == 0:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row][col + 1] == player and currentState[row][col + 2] == 0 and currentState[row][col + 3] == player:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row][col + 1] == 0 and currentState[row][col + 2] == player and currentState[row][col + 3] == player:
-                    opportunities += 1
-                elif currentState[row][col] == 0 and currentState[row][col + 1] == player and currentState[row][col + 2] == player and currentState[row][col + 3] == player:
-                    opportunities += 1
-
-        # find the number of columns of length 4 with 3 coins of the player and 1 empty space
-        for col in range(7):
-            for row in range(3):
-                if currentState[row][col] == player and currentState[row + 1][col] == player and currentState[row + 2][col] == player and currentState[row + 3][col] == 0:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row + 1][col] == player and currentState[row + 2][col] == 0 and currentState[row + 3][col] == player:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row + 1][col] == 0 and currentState[row + 2][col] == player and currentState[row + 3][col] == player:
-                    opportunities += 1
-                elif currentState[row][col] == 0 and currentState[row + 1][col] == player and currentState[row + 2][col] == player and currentState[row + 3][col] == player:
-                    opportunities += 1
-
-        # find the number of diagonals of length 4 with 3 coins of the player and 1 empty space
-        for row in range(3):
-            for col in range(4):
-                if currentState[row][col] == player and currentState[row + 1][col + 1] == player and currentState[row + 2][col + 2] == player and currentState[row + 3][col + 3] == 0:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row + 1][col + 1] == player and currentState[row + 2][col + 2] == 0 and currentState[row + 3][col + 3] == player:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row + 1][col + 1] == 0 and currentState[row + 2][col + 2] == player and currentState[row + 3][col + 3] == player:
-                    opportunities += 1
-                elif currentState[row][col] == 0 and currentState[row + 1][col + 1] == player and currentState[row + 2][col + 2] == player and currentState[row + 3][col + 3] == player:
-                    opportunities += 1
-
-        for row in range(2, 6):
-            for col in range(4):
-                if currentState[row][col] == player and currentState[row - 1][col + 1] == player and currentState[row - 2][col + 2] == player and currentState[row - 3][col + 3] == 0:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row - 1][col + 1] == player and currentState[row - 2][col + 2] == 0 and currentState[row - 3][col + 3] == player:
-                    opportunities += 1
-                elif currentState[row][col] == player and currentState[row - 1][col + 1] == 0 and currentState[row - 2][col + 2] == player and currentState[row - 3][col + 3] == player:
-                    opportunities += 1
-                elif currentState[row][col] == 0 and currentState[row - 1][col + 1] == player and currentState[row - 2][col + 2] == player and currentState[row - 3][col + 3] == player:
-                    opportunities += 1
-
-        return opportunities
+        # Number of four-cell windows with 3 coins of the player and 1 empty space
+        board = self._AsBitboard(currentState)
+        return OPEN_THREE_COUNTS[player - 1](board.bitboards[0], board.bitboards[1])
 
     def findNumberOfOpportunities2(self, currentState):
-
-        opportunityOfPlayer1_3 = 0
-        opportunityOfPlayer1_2 = 0
-        opportunityOfPlayer1_1 = 0
-
-        opportunityOfPlayer2_3 = 0
-        opportunityOfPlayer2_2 = 0
-        opportunityOfPlayer2_1 = 0
-
-        for row in range(6):
-            for col in range(4):
-                # find the number of of coins of player 1, 2 and empty spaces
-                player1 = 0
-                player2 = 0
-                empty = 0
-                for i in range(4):
-                    if currentState[row][col + i] == 1:
-                        player1 += 1
-                    elif currentState[row][col + i] == 2:
-                        player2 += 1
-                    else:
-                        empty += 1
-
-                if player1 == 3 and empty == 1:
-                    opportunityOfPlayer1_3 += 1
-                elif player1 == 2 and empty == 2:
-                    opportunityOfPlayer1_2 += 1
-                elif player1 == 1 and empty == 3:
-                    opportunityOfPlayer1_1 += 1
-                elif player2 == 3 and empty == 1:
-                    opportunityOfPlayer2_3 += 1
-                elif player2 == 2 and empty == 2:
-                    opportunityOfPlayer2_2 += 1
-                elif player2 == 1 and empty == 3:
-                    opportunityOfPlayer2_1 += 1
-
-        for col in range(7):
-            for row in range(3):
-                # find the number of of coins of player 1, 2 and empty spaces
-                player1 = 0
-                player2 = 0
-                empty = 0
-                for i in range(4):
-                    if currentState[row + i][col] == 1:
-                        player1 += 1
-                    elif currentState[row + i][col] == 2:
-                        player2 += 1
-                    else:
-                        empty += 1
-
-                if player1 == 3 and empty == 1:
-                    opportunityOfPlayer1_3 += 1
-                elif player1 == 2 and empty == 2:
-                    opportunityOfPlayer1_2 += 1
-                elif player1 == 1 and empty == 3:
-                    opportunityOfPlayer1_1 += 1
-                elif player2 == 3 and empty == 1:
-                    opportunityOfPlayer2_3 += 1
-                elif player2 == 2 and empty == 2:
-                    opportunityOfPlayer2_2 += 1
-                elif player2 == 1 and empty == 3:
-                    opportunityOfPlayer2_1 += 1
-
-        for row in range(3):
-            for col in range(4):
-                # find the number of of coins of player 1, 2 and empty spaces
-                player1 = 0
-                player2 = 0
-                empty = 0
-                for i in range(4):
-                    if currentState[row + i][col + i] == 1:
-                        player1 += 1
-                    elif currentState[row + i][col + i] == 2:
-                        player2 += 1
-                    else:
-                        empty += 1
-
-                if player1 == 3 and empty == 1:
-                    opportunityOfPlayer1_3 += 1
-                elif player1 == 2 and empty == 2:
-                    opportunityOfPlayer1_2 += 1
-                elif player1 == 1 and empty == 3:
-                    opportunityOfPlayer1_1 += 1
-                elif player2 == 3 and empty == 1:
-                    opportunityOfPlayer2_3 += 1
-                elif player2 == 2 and empty == 2:
-                    opportunityOfPlayer2_2 += 1
-                elif player2 == 1 and empty == 3:
-                    opportunityOfPlayer2_1 += 1
-
-        for row in range(2, 6):
-            for col in range(4):
-                # find the number of of coins of player 1, 2 and empty spaces
-                player1 = 0
-                player2 = 0
-                empty = 0
-                for i in range(4):
-                    if currentState[row - i][col + i] == 1:
-                        player1 += 1
-                    elif currentState[row - i][col + i] == 2:
-                        player2 += 1
-                    else:
-                        empty += 1
-
-                if player1 == 3 and empty == 1:
-                    opportunityOfPlayer1_3 += 1
-                elif player1 == 2 and empty == 2:
-                    opportunityOfPlayer1_2 += 1
-                elif player1 == 1 and empty == 3:
-                    opportunityOfPlayer1_1 += 1
-                elif player2 == 3 and empty == 1:
-                    opportunityOfPlayer2_3 += 1
-                elif player2 == 2 and empty == 2:
-                    opportunityOfPlayer2_2 += 1
-                elif player2 == 1 and empty == 3:
-                    opportunityOfPlayer2_1 += 1
-
-        return opportunityOfPlayer2_3, opportunityOfPlayer2_2, opportunityOfPlayer2_1, opportunityOfPlayer1_3, opportunityOfPlayer1_2, opportunityOfPlayer1_1
+        # Counts the four-cell windows holding 3, 2 or 1 coins of a single player
+        # using the precomputed window masks of the bitboard, or the running
+        # totals of an EvaluatedBitboard.
+        return self._AsBitboard(currentState).CountWindows()
 
     def heuristicFunction2(self, currentState):
-
-        # find the opportunities for each player
-        player1 = self.findNumberOfOpportunities1(currentState, 1)
-        player2 = self.findNumberOfOpportunities1(currentState, 2)
-
-        return (player2 - player1)*100
+        # Opportunities (see findNumberOfOpportunities1) of player 2 minus those
+        # of player 1, times 100
+        return EVALUATORS['heuristic2'](self._AsBitboard(currentState))
 
     def heuristicFunction3(self, currentState):
+        # Windows of 3, 2 and 1 coins of player 2 and none of player 1 score
+        # 1000, 100 and 10, and the same windows of player 1 as much against
+        return EVALUATORS['heuristic3'](self._AsBitboard(currentState))
 
-        # find the opportunities for each player
-        player2_3, player2_2, player2_1, player1_3, player1_2, player1_1 = self.findNumberOfOpportunities2(
-            currentState)
-
-        opp2 = player2_3*1000 + player2_2*100 + player2_1*10
-        opp1 = player1_3*1000 + player1_2*100 + player1_1*10
-
-        return opp2 - opp1
+    def _AsBitboard(self, currentState):
+        # The heuristics also take GetCurrentState() grids
+        if isinstance(currentState, Bitboard):
+            return currentState
+        return Bitboard.FromState(currentState)
 
     def EvaluateBoard(self, currentState):
         # Evaluate the given board state based on an evaluation function.
@@ -392,33 +415,27 @@ class GameTreePlayer:
         elif winner == 1:
             # return -1000
             return -100000
-        return self.heuristicFunction3(currentState)
-
-    def _CoinRowAfterAction(self, action, currentState):
-        cRow = -1
-        c = action
-        for r in range(5, -1, -1):
-            if currentState[r][c] == 0:
-                cRow = r
-                break
-        return cRow
+        return self.evaluator(currentState)
+
+    def EvaluateHorizon(self, currentState, isMaximizingPlayer):
+        # EvaluateBoard plus the static threat analysis of Threats.py: a
+        # position the player to move wins or loses by immediate threats is
+        # scored as won or lost, any other gets the parity score of its threats
+        outcome, score = HorizonScore(currentState, 2 if isMaximizingPlayer else 1)
+        if outcome is not None:
+            return 100000 if (outcome == WIN) == isMaximizingPlayer else -100000
+        return self.EvaluateBoard(currentState) + score
 
     def MakeMove(self, currentState, action, player):
         # Apply the given action (drop a coin into a column) for the specified player.
-        # Return the resulting board state.
-
-        # find the row in which the coin will be placed
-        row = self._CoinRowAfterAction(action, currentState)
-
-        # create a copy of the current state
-        newState = copy.deepcopy(currentState)
+        # The board is modified in place, UnmakeMove takes the coin back.
+        currentState.Push(action, player)
 
-        # place the coin
-        newState[row][action] = player
+    def UnmakeMove(self, currentState):
+        # Take back the last move made on the board.
+        currentState.Pop()
 
-        return newState
-
-    def FindBestAction(self, currentState):
+    def FindBestAction(self, currentState, timeBudget=None, maxDepth=None):
         """
         Modify this function to search the GameTree instead of getting input from the keyboard.
         The currentState of the game is passed to the function.
@@ -426,18 +443,174 @@ class GameTreePlayer:
         currentState[5][6] refers to the bottom-right corner position.
         Action refers to the column in which you decide to put your coin. The actions (and columns) are numbered from left to right.
         Action 0 is refers to the left-most column and action 6 refers to the right-most column.
+
+        See Search for timeBudget and maxDepth. The statistics of the search are
+        kept in lastSearchStats.
         """
 
-        bestAction = self.MinimaxAlphaBeta(
-            currentState, cutOffDepth, -float('inf'), float('inf'), True)
+        bestAction = self.Search(currentState, timeBudget, maxDepth).bestAction
         # print("Best Action : {0}".format(bestAction))
         return bestAction
 
+    def Search(self, currentState, timeBudget=None, maxDepth=None):
+        """
+        Search the given state (player 2 to move).
 
-def LoadTestcaseStateFromCSVfile():
+        Parameters:
+        currentState (list of lists): The state as returned by FourConnect.GetCurrentState().
+        timeBudget (float): Defaults to self.timeBudget; ValueError unless it is
+            None or a positive, finite number.
+            Without it the tree is searched to self.cutOffDepth. With it
+            (in seconds) the search deepens one ply at a time, up to maxDepth, and keeps
+            the best action of the last depth that completed within the budget.
+        maxDepth (int): Deepest iteration of a time-budgeted search.
+
+        A position found in the opening book, the tablebase or (without a time
+        budget) the position cache is answered without searching, and one with
+        fewer than solverThreshold empty cells is solved exactly.
+
+        Returns:
+        stats (SearchStats): The best action and the statistics of the search.
+        """
+        if timeBudget is None:
+            timeBudget = self.timeBudget
+        if timeBudget is not None and not (math.isfinite(timeBudget) and timeBudget > 0):
+            raise ValueError("timeBudget must be a positive number of seconds")
+        board = self.boardClass.FromState(currentState)
+        stats = self.StartSearch(board)
+        table = self.transpositionTable
+        if table is not None:
+            startProbes = table.hits, table.misses, table.collisions
+        startTime = time.perf_counter()
+
+        bookEntry = None
+        if self.openingBook is not None:
+            bookEntry = self.openingBook.Probe(board)
+        tablebaseEntry = None
+        if bookEntry is None and self.tablebase is not None and board.moveCount % 2 == 1:
+            tablebaseEntry = self.tablebase.Probe(board)
+        cacheKey = cacheEntry = None
+        if self.positionCache is not None and timeBudget is None \
+                and bookEntry is None and tablebaseEntry is None:
+            if self.symmetry:
+                key, mirrored = board.CanonicalKey()
+            else:
+                key, mirrored = board.Key(), False
+            cacheKey = SlotKey(key, self.cutOffDepth, self.cacheVariant)
+            cacheEntry = self.positionCache.Lookup(cacheKey)
+        if bookEntry is not None:
+            stats.bestAction, stats.score = bookEntry
+            stats.depth = self.openingBook.depth
+            stats.bookHit = True
+        elif tablebaseEntry is not None:
+            stats.bestAction, stats.score = tablebaseEntry
+            stats.depth = 42 - board.moveCount
+            stats.solved = True
+            stats.distanceToMate = DistanceToMate(stats.score, board.moveCount)
+            stats.tablebaseHits = 1
+        elif cacheEntry is not None:
+            bestAction, stats.score, flags = cacheEntry
+            stats.bestAction = MirrorMove(bestAction) if mirrored else bestAction
+            stats.cacheHit = True
+            stats.solved = bool(flags & SOLVED)
+            if stats.solved:
+                stats.depth = 42 - board.moveCount
+                stats.distanceToMate = DistanceToMate(stats.score, board.moveCount)
+            else:
+                stats.depth = self.cutOffDepth
+        elif 42 - board.moveCount < self.solverThreshold:
+            self.SolveExactly(board)
+        elif timeBudget is None:
+            stats.bestAction, stats.score = self.SearchRoot(
+                board, self.cutOffDepth, self.OrderActions(board, True))
+            stats.depth = self.cutOffDepth
+        else:
+            self.IterativeDeepening(board, startTime + timeBudget, maxDepth)
+        if cacheKey is not None and cacheEntry is None and stats.bestAction is not None:
+            self.positionCache.Store(cacheKey,
+                                     MirrorMove(stats.bestAction) if mirrored else stats.bestAction,
+                                     stats.score, SOLVED if stats.solved else 0)
+
+        stats.time = time.perf_counter() - startTime
+        if table is not None:
+            stats.ttHits = table.hits - startProbes[0]
+            stats.ttMisses = table.misses - startProbes[1]
+            stats.ttCollisions = table.collisions - startProbes[2]
+        self.totalNodes += stats.nodes
+        self.lastSearchStats = stats
+        return stats
+
+    def SolveExactly(self, currentState):
+        # Perfect play for player 2 with the negamax solver of Solver.py
+        if self.solver is None:
+            self.solver = Solver()
+        stats = self.stats
+        self.solver.nodes = 0
+        stats.bestAction, stats.score = self.solver.BestMove(currentState, 2)
+        stats.nodes = self.solver.nodes
+        stats.depth = 42 - currentState.moveCount
+        stats.solved = True
+        stats.distanceToMate = DistanceToMate(stats.score, currentState.moveCount)
+
+    def StartSearch(self, currentState):
+        # Reset the per-search state for a search rooted at currentState
+        self.stats = SearchStats()
+        self.rootMoveCount = currentState.moveCount
+        self.moveOrdering.NewSearch()
+        if self.transpositionTable is not None:
+            self.transpositionTable.NewSearch()
+        return self.stats
+
+    def IterativeDeepening(self, currentState, deadline, maxDepth=None):
+        # Search depth 1, 2, 3, ... until the deadline. The root moves of each
+        # iteration are ordered by the previous one: its best move first, the
+        # rest as before. Below the root the transposition table supplies the
+        # previous principal variation as the first move to try.
+        emptyCells = 42 - currentState.moveCount
+        if maxDepth is None or maxDepth > emptyCells:
+            maxDepth = emptyCells
+        stats = self.stats
+        rootActions = self.OrderActions(currentState, True)
+        stats.bestAction = rootActions[0]
+        if len(rootActions) == 1:
+            return
+
+        startTime = time.perf_counter()
+        depth = 1
+        while depth <= maxDepth:
+            # Depth 1 always completes, so there is always an answer
+            self.deadline = deadline if depth > 1 else None
+            # A search cut off by the clock leaves its moves on the board
+            board = currentState.Copy()
+            try:
+                action, eval = self.SearchRoot(board, depth, rootActions)
+            except SearchTimeout:
+                break
+            finally:
+                self.deadline = None
+            stats.bestAction = action
+            stats.score = eval
+            stats.depth = depth
+            if abs(eval) >= 100000:  # A forced win or loss was found
+                break
+            rootActions.remove(action)
+            rootActions.insert(0, action)
+            # The next iteration takes several times longer than this one,
+            # do not start it if it cannot finish
+            now = time.perf_counter()
+            if now + (now - startTime) >= deadline:
+                break
+            depth += 1
+
+
+def LoadTestcaseStateFromCSVfile(path='./testcases/testcase_easy1.csv', index=0):
+    # A binary position file (see Records.py) may be given instead of a CSV
+    # file; index selects one of its positions
+    if IsRecordFile(path):
+        return ReadPosition(path, index)
     testcaseState = list()
 
-    with open('./testcases/testcase_easy1.csv', 'r') as read_obj:
+    with open(path, 'r') as read_obj:
         csvReader = csv.reader(read_obj)
         for csvRow in csvReader:
             row = [int(r) for r in csvRow]
@@ -445,10 +618,15 @@ def LoadTestcaseStateFromCSVfile():
         return testcaseState
 
 
-def PlayGame():
-    fourConnect = FourConnect()
+def PlayGame(gameTree=None, level=BOARDS, fourConnect=None):
+    # The game is written out at the given level (SILENT, MOVES or BOARDS, see
+    # FourConnect.py). A FourConnect may be passed in instead, with its own
+    # observers, e.g. to read its moves (actions) afterwards.
+    if fourConnect is None:
+        fourConnect = FourConnect(level)
     # fourConnect.PrintGameState()
-    gameTree = GameTreePlayer()
+    if gameTree is None:
+        gameTree = GameTreePlayer()
 
     move = 0
     while move < 42:  # At most 42 moves are possible
@@ -458,7 +636,6 @@ def PlayGame():
             currentState = fourConnect.GetCurrentState()
             gameTreeAction = gameTree.FindBestAction(currentState)
             fourConnect.GameTreePlayerAction(gameTreeAction)
-        fourConnect.PrintGameState()
         move += 1
         if fourConnect.winner != None:
             break
@@ -467,11 +644,7 @@ def PlayGame():
     You can add your code here to count the number of wins average number of moves etc.
     You can modify the PlayGame() function to play multiple games if required.
     # """
-    if fourConnect.winner == None:
-        print("Game is drawn.")
-    else:
-        print("Winner : Player {0}\n".format(fourConnect.winner))
-    print("Moves : {0}".format(move))
+    fourConnect.GameOver(move)
 
     return fourConnect.winner, move
 
@@ -482,7 +655,7 @@ def RunTestCase():
     Player 2 moves first. Player 2 must win in 5 moves to pass the testcase; Otherwise, the program fails to pass the testcase.
     """
 
-    fourConnect = FourConnect()
+    fourConnect = FourConnect(BOARDS)
     gameTree = GameTreePlayer()
     testcaseState = LoadTestcaseStateFromCSVfile()
     fourConnect.SetCurrentState(testcaseState)
@@ -496,7 +669,6 @@ def RunTestCase():
             currentState = fourConnect.GetCurrentState()
             gameTreeAction = gameTree.FindBestAction(currentState)
             fourConnect.GameTreePlayerAction(gameTreeAction)
-        fourConnect.PrintGameState()
         move += 1
         if fourConnect.winner != None:
             break
@@ -508,68 +680,58 @@ def RunTestCase():
     print("Moves : {0}".format(move))
 
 
-def PlayGameRandom():
-    global cutOffDepth, recursiveMinimaxCalls
-
-    for i in range(3):
-        # play 100 games and count the number of wins for each player
-        loss = 0
-        wins = 0
-        draws = 0
-
-        avgMovesToWin = 0
-        avgMovesToLose = 0
-        avgMovesToDraw = 0
-        avgRecursiveMinimaxCalls = 0
-        avgDurationOfGame = 0
-
-        for i in range(100):
-            print("Game {0}".format(i + 1))
-            startTime = time.time()
-            winner, moves = PlayGame()
-            endTime = time.time()
-            durationOfGame = endTime - startTime
-            avgDurationOfGame += durationOfGame
-
-            if winner == 1:
-                loss += 1
-                avgMovesToLose += moves
-            elif winner == 2:
-                wins += 1
-                avgMovesToWin += moves
-            else:
-                draws += 1
-                avgMovesToDraw += moves
+def RunMateTestCases(plies=5, threatsOnly=False, workers=None):
+    """
+    Prove or disprove a forced win for player 2 within plies, in every file
+    in testcases/ next to this file, in parallel (see MateSearch.py). Prints the proven line and
+    the nodes searched per test case.
+
+    Returns:
+    reports (list of dict): One report per test case, as from SolveTestcase.
+    """
+    from MateSearch import RunMateSearch, TestcasePaths
+
+    paths = TestcasePaths()
+    reports = []
+    for report in RunMateSearch(paths, plies, threatsOnly, workers):
+        reports.append(report)
+        if report['result'] == 'win':
+            print("{0}: player 2 wins in {1} plies, line {2} ({3} nodes)".format(
+                report['testcase'], report['plies'], report['line'], report['nodes']))
+        else:
+            print("{0}: {1} within {2} plies ({3} nodes)".format(
+                report['testcase'], report['result'], plies, report['nodes']))
+    return reports
 
-        if wins != 0:
-            avgMovesToWin /= wins
-        if loss != 0:
-            avgMovesToLose /= loss
-        if draws != 0:
-            avgMovesToDraw /= draws
 
-        avgRecursiveMinimaxCalls = recursiveMinimaxCalls / 100
-        avgDurationOfGame /= 100
+def PlayGameRandom():
+    # Play 100 games for each cutoff depth on all CPUs (see Tournament.py)
+    from Tournament import RunTournament, SummarizeResults
+
+    records = []
+    for record in RunTournament(depths=(3, 4, 5), games=100):
+        records.append(record)
+        print("Game {0} (cutoff depth {1})".format(
+            record['seed'] + 1, record['cutOffDepth']))
 
+    for summary in SummarizeResults(records):
         # save the results in a text file for this cutoff depth
         with open('func3_results.txt', 'a') as f:
             f.write("With move ordering heuristic\n")
-            f.write("Cutoff depth : {0}\n".format(cutOffDepth))
-            f.write("Wins : {0}\n".format(wins))
-            f.write("Loss : {0}\n".format(loss))
-            f.write("Draws : {0}\n".format(draws))
-            f.write("Average moves to win : {0}\n".format(avgMovesToWin))
-            f.write("Average moves to lose : {0}\n".format(avgMovesToLose))
-            f.write("Average moves to draw : {0}\n".format(avgMovesToDraw))
+            f.write("Cutoff depth : {0}\n".format(summary['cutOffDepth']))
+            f.write("Wins : {0}\n".format(summary['wins']))
+            f.write("Loss : {0}\n".format(summary['loss']))
+            f.write("Draws : {0}\n".format(summary['draws']))
+            f.write("Average moves to win : {0}\n".format(summary['avgMovesToWin']))
+            f.write("Average moves to lose : {0}\n".format(summary['avgMovesToLose']))
+            f.write("Average moves to draw : {0}\n".format(summary['avgMovesToDraw']))
             f.write("Average recursive minimax calls : {0}\n".format(
-                avgRecursiveMinimaxCalls))
+                summary['avgRecursiveMinimaxCalls']))
             f.write("Average duration of game : {0}\n".format(
-                avgDurationOfGame))
+                summary['avgDurationOfGame']))
             f.write("\n")
 
-        print("Cutoff depth : {0}".format(cutOffDepth))
-
-        cutOffDepth += 1
+        print("Cutoff depth : {0}".format(summary['cutOffDepth']))
 
 
 def main():
@@ -580,6 +742,8 @@ def main():
 
     # RunTestCase()
 
+    # RunMateTestCases()
+
 
 if __name__ == '__main__':
     main()
@@ -0,0 +1,149 @@
+"""
+The compiled evaluators (Evaluation.py) and the NumPy batch evaluation
+(BatchEvaluation.py) against scans of the grid written like the original
+heuristicFunction1/2/3, and BatchGameTreePlayer's moves against
+GameTreePlayer's.
+
+Usage: python3 -m pytest test_evaluation.py
+"""
+import random
+
+import pytest
+
+from Bitboard import Bitboard, EvaluatedBitboard
+from Evaluation import EVALUATORS
+from main import GameTreePlayer
+from Solver import RandomPosition
+
+# Score of a window by the number of coins of a single player in it
+WEIGHTS = (0, 10, 100, 1000, 0)
+
+
+def GridWindows(length):
+    # The windows the original scans read, as lists of (row, col). Their
+    # rising diagonals start on rows 2 to 5, so with four cells those from
+    # row 2 end on row -1, which the grid reads as the bottom row.
+    windows = []
+    for row in range(6):
+        for col in range(8 - length):
+            windows.append([(row, col + i) for i in range(length)])
+    for col in range(7):
+        for row in range(7 - length):
+            windows.append([(row + i, col) for i in range(length)])
+    for row in range(7 - length):
+        for col in range(8 - length):
+            windows.append([(row + i, col + i) for i in range(length)])
+    for row in range(2, 6):
+        for col in range(8 - length):
+            windows.append([(row - i, col + i) for i in range(length)])
+    return windows
+
+
+def GridCounts(state, length):
+    # (coins of player 1, coins of player 2) in every window
+    counts = []
+    for cells in GridWindows(length):
+        coins = [state[row][col] for row, col in cells]
+        counts.append((coins.count(1), coins.count(2)))
+    return counts
+
+
+def GridHeuristic1(state):
+    return sum((c2 == 3) - (c1 == 3) for c1, c2 in GridCounts(state, 3))
+
+
+def GridHeuristic2(state):
+    return 100 * sum((c2 == 3 and c1 == 0) - (c1 == 3 and c2 == 0)
+                     for c1, c2 in GridCounts(state, 4))
+
+
+def GridHeuristic3(state):
+    return sum((WEIGHTS[c2] if c1 == 0 else 0) - (WEIGHTS[c1] if c2 == 0 else 0)
+               for c1, c2 in GridCounts(state, 4))
+
+
+def GridWinner(state):
+    for cells in GridWindows(4):
+        if all(row >= 0 for row, _ in cells):
+            coins = {state[row][col] for row, col in cells}
+            if len(coins) == 1 and 0 not in coins:
+                return coins.pop()
+    return None
+
+
+GRID_HEURISTICS = {
+    'heuristic1': GridHeuristic1,
+    'heuristic2': GridHeuristic2,
+    'heuristic3': GridHeuristic3,
+}
+
+
+def RandomStates(count, seed=0, maxCoins=40):
+    # GetCurrentState() grids of random positions with no four in a row
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        position = RandomPosition(rng, rng.randint(0, maxCoins))
+        if position is not None:
+            states.append(position[0].ToState())
+    return states
+
+
+def WonStates(count, seed=1):
+    # Random positions just after the move that made four in a row
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        position = RandomPosition(rng, rng.randint(6, 40))
+        if position is None:
+            continue
+        board, player = position
+        wins = [col for col in range(7) if board.CanPlay(col) and board.IsWinningMove(col, 3 - player)]
+        if wins:
+            board.Push(wins[0], 3 - player)
+            states.append(board.ToState())
+    return states
+
+
+@pytest.mark.parametrize('name', sorted(GRID_HEURISTICS))
+def test_compiled_evaluators_match_grid_scans(name):
+    player = GameTreePlayer()
+    method = getattr(player, 'heuristicFunction' + name[-1])
+    for state in RandomStates(300):
+        expected = GRID_HEURISTICS[name](state)
+        assert EVALUATORS[name](Bitboard.FromState(state)) == expected, state
+        assert method(state) == expected, state
+
+
+def test_incremental_score_matches_grid_scan():
+    for state in RandomStates(300):
+        assert EvaluatedBitboard.FromState(state).score == GridHeuristic3(state), state
+
+
+def test_evaluate_batch_matches_grid_scan():
+    np = pytest.importorskip('numpy')
+    from BatchEvaluation import EvaluateBatch
+
+    states = RandomStates(200) + WonStates(50)
+    expected = []
+    for state in states:
+        winner = GridWinner(state)
+        expected.append({1: -100000, 2: 100000}.get(winner, GridHeuristic3(state)))
+    scores = EvaluateBatch(np.array(states, dtype=np.int8))
+    assert scores.tolist() == expected
+
+
+def test_batch_player_picks_plain_players_moves():
+    pytest.importorskip('numpy')
+    from BatchEvaluation import BatchGameTreePlayer
+
+    rng = random.Random(2)
+    count = 0
+    while count < 20:
+        position = RandomPosition(rng, rng.randrange(1, 22, 2))
+        if position is None:
+            continue
+        state = position[0].ToState()
+        expected = GameTreePlayer(4, threatPruning=False).FindBestAction(state)
+        assert BatchGameTreePlayer(4, batchDepth=2).FindBestAction(state) == expected, state
+        count += 1
@@ -0,0 +1,40 @@
+"""
+The Myopic player's bitboard move lists against the grid scan they replaced.
+
+Usage: python3 -m pytest test_myopic.py
+"""
+import random
+
+from FourConnect import FourConnect, SILENT
+from Solver import RandomPosition
+
+
+def RandomStates(count, seed=0):
+    # GetCurrentState() grids of random positions with 0 to 40 coins
+    rng = random.Random(seed)
+    states = []
+    while len(states) < count:
+        position = RandomPosition(rng, rng.randint(0, 40))
+        if position is not None:
+            states.append(position[0].ToState())
+    return states
+
+
+def test_myopic_moves_match_grid_scan():
+    game = FourConnect(SILENT)
+    for state in RandomStates(500):
+        game.SetCurrentState(state)
+        assert game._47_FindMyopicMoves() == game._47_FindMyopicMovesOnGrid(), state
+
+
+def test_myopic_moves_cover_wins_and_losing_moves():
+    # The seeded positions include every kind of move the lists tell apart
+    game = FourConnect(SILENT)
+    myopicWins = gameTreeWins = losingMoves = 0
+    for state in RandomStates(500):
+        game.SetCurrentState(state)
+        myopicWin, gameTreeWin, _, losing = game._47_FindMyopicMovesOnGrid()
+        myopicWins += myopicWin is not None
+        gameTreeWins += gameTreeWin is not None
+        losingMoves += len(losing)
+    assert myopicWins and gameTreeWins and losingMoves